@@ -0,0 +1,60 @@
+import argparse
+from pathlib import Path
+
+from cycling_safety_analysis.data import batch, calibration, cleaner, instrument
+
+# Base Directories
+BASE_DATA = Path("./data/processed")
+CALIBRATION_PATH = Path("./data/calibration.json")
+
+# Distances in the rides are in mm and the calibration models are in m.
+MM_PER_M = 1000
+
+# Choices of --clean. "sensor" cleans each ride as in the outdoor notebooks.
+CLEANERS = {
+    "sensor": "sensor",
+    "tof": cleaner.clean_tof_data,
+    "clusters": cleaner.average_clusters,
+    "none": None,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the passes of every outdoor ride.")
+    parser.add_argument("--source", type=Path, default=BASE_DATA, help="processed data folder")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--high", type=int, default=3500, help="highest distance in mm")
+    parser.add_argument("--low", type=int, default=0, help="lowest distance in mm")
+    parser.add_argument(
+        "--clean", choices=list(CLEANERS), default="sensor", help="cleaning of the distances of each ride"
+    )
+    parser.add_argument("--calibrate", metavar="CONDITION", help="correct rides with this calibration")
+    parser.add_argument("--output", type=Path, help="write the summary to this CSV file")
+    parser.add_argument(
+        "--profile", type=Path, help="write the time of each stage to this JSON file, using one process"
+    )
+    args = parser.parse_args()
+    if args.profile:
+        # Stages run in worker processes are not recorded, so every ride is
+        # analyzed in this process.
+        args.workers = 1
+        instrument.enable(track_memory=True)
+
+    calibrations = {}
+    if args.calibrate:
+        store = calibration.CalibrationStore(CALIBRATION_PATH)
+        calibrations = {
+            sensor: store.get(sensor, condition).rescale(MM_PER_M)
+            for sensor, condition in store.keys()
+            if condition == args.calibrate
+        }
+
+    rides = batch.find_rides(args.source)
+    summary = batch.analyze_rides(
+        rides, args.workers, calibrations, high=args.high, low=args.low, clean=CLEANERS[args.clean]
+    )
+    print(summary.to_string())
+    if args.output:
+        summary.to_csv(args.output)
+    if args.profile:
+        print(instrument.report())
+        instrument.to_json(file_path=args.profile)
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import openpyxl
+
+from cycling_safety_analysis.data import analysis, cleaner, loader, synthetic
+from cycling_safety_analysis.format import jrt_bb2x, jrt_bb2x_stream, raspberry_pi, tof
+from cycling_safety_analysis.graphing import outdoor_graphs
+
+DEFAULT_SIZES = [10**3, 10**4, 10**5, 10**6]
+
+# Time and distance normalized to 1 when clustering, so that neighborhoods
+# stay the same size however long the ride is.
+DBSCAN_SCALE = (60_000, 5000)
+
+# Largest ride each stage is run on by default. Larger rides are recorded as
+# skipped, as they would take too long or run out of memory.
+STAGE_LIMITS = {
+    "loader.load_data_from_file": 10**7,
+    "loader.load_arrays_from_file[session]": 10**8,
+    "cleaner.clean_tof_data": 10**8,
+    "cleaner.average_clusters": 10**8,
+    "analysis.find_clusters_DBSCAN": 10**6,
+    "raspberry_pi.format_text_file": 10**7,
+    "jrt_bb2x.format_protocol_file": 10**7,
+    "jrt_bb2x.format_ascii_file": 10**7,
+    "jrt_bb2x_stream.format_stream_file": 10**7,
+    "tof.format_excel_file": 10**5,
+    "outdoor_graphs.scatter_time_vs_distance": 10**6,
+    "outdoor_graphs.scatter_time_vs_distance[decimated]": 10**7,
+    "outdoor_graphs.scatter_clusters_with_dbscan": 10**4,
+    "outdoor_graphs.interactive_scatter": 10**6,
+}
+
+# Stages which cluster, and so need the points with a known distance.
+CLUSTER_STAGES = {"analysis.find_clusters_DBSCAN", "outdoor_graphs.scatter_clusters_with_dbscan"}
+
+
+def write_protocol_file(file_path: Path, timings: np.ndarray, distances: np.ndarray) -> None:
+    frames = jrt_bb2x.encode_frames(np.maximum(distances, 0))
+    stamps = synthetic.format_timings(timings, milliseconds=True)
+    with open(file_path, "w") as f:
+        for stamp, frame in zip(stamps, frames.tolist()):
+            f.write(f"[2023-07-31 {stamp} R]{' '.join(f'{byte:02X}' for byte in frame)} \n")
+
+
+def write_ascii_file(file_path: Path, timings: np.ndarray, distances: np.ndarray) -> None:
+    stamps = synthetic.format_timings(timings, milliseconds=True)
+    # The laser's software writes E015 when it has no reading.
+    readings = [str(int(d)) if d > 0 else "E015" for d in distances.tolist()]
+    with open(file_path, "w") as f:
+        f.write("".join(f"[2023-08-19 {stamp} R]{reading}\n" for stamp, reading in zip(stamps, readings)))
+
+
+def write_stream_file(file_path: Path, distances: np.ndarray) -> None:
+    jrt_bb2x.encode_frames(np.maximum(distances, 0)).tofile(file_path)
+
+
+def write_excel_file(file_path: Path, distances: np.ndarray) -> None:
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([tof.DISTANCE_COLUMN])
+    for distance in (distances / 1000).tolist():
+        sheet.append([distance])
+    workbook.save(file_path)
+
+
+def plot(function, *args, **kwargs) -> None:
+    fig, ax = plt.subplots()
+    function(ax, *args, **kwargs)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def plot_interactive(timings: np.ndarray, distances: np.ndarray) -> None:
+    fig, (ax_1, ax_2) = plt.subplots(1, 2)
+    outdoor_graphs.interactive_scatter(fig, ax_1, ax_2, [], timings, distances)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def prepare(folder: Path, generator: synthetic.RideGenerator, points: int, stages: list[str]) -> dict:
+    """
+    Write the inputs of the stages to be run for a ride of the given size.
+    The columns of the ride are memory-mapped from its session, and only the
+    inputs the stages need are written or copied into memory.
+
+    Args:
+        folder (Path): Folder to write the inputs to.
+        generator (synthetic.RideGenerator): Generator of the ride.
+        points (int): Number of readings.
+        stages (list[str]): Stages which will be run.
+
+    Returns:
+        dict: Paths to the inputs and the arrays of the ride.
+    """
+    inputs = {"session": generator.write(folder / "ride.session", points)}
+    timings, distances, _ = loader.load_arrays_from_file(inputs["session"], clean=False)
+    inputs["timings"], inputs["distances"] = timings, distances
+
+    if CLUSTER_STAGES & set(stages):
+        valid = distances != -1
+        inputs["valid_timings"], inputs["valid_distances"] = timings[valid], distances[valid]
+    if {"loader.load_data_from_file", "raspberry_pi.format_text_file"} & set(stages):
+        inputs["text"] = generator.write(folder / "ride.txt", points)
+    if "jrt_bb2x.format_protocol_file" in stages:
+        inputs["protocol"] = folder / "protocol.txt"
+        write_protocol_file(inputs["protocol"], timings, distances)
+    if "jrt_bb2x.format_ascii_file" in stages:
+        inputs["ascii"] = folder / "ascii.txt"
+        write_ascii_file(inputs["ascii"], timings, distances)
+    if "jrt_bb2x_stream.format_stream_file" in stages:
+        inputs["stream"] = folder / "stream.bin"
+        write_stream_file(inputs["stream"], distances)
+    if "tof.format_excel_file" in stages:
+        inputs["excel"] = folder / "tof.xlsx"
+        write_excel_file(inputs["excel"], distances)
+    return inputs
+
+
+def get_stages(inputs: dict, output: Path) -> dict:
+    return {
+        "loader.load_data_from_file": lambda: loader.load_data_from_file(inputs["text"]),
+        "loader.load_arrays_from_file[session]": lambda: loader.load_arrays_from_file(inputs["session"]),
+        "cleaner.clean_tof_data": lambda: cleaner.clean_tof_data(inputs["distances"]),
+        "cleaner.average_clusters": lambda: cleaner.average_clusters(inputs["distances"]),
+        "analysis.find_clusters_DBSCAN": lambda: analysis.find_clusters_DBSCAN(
+            inputs["valid_timings"], inputs["valid_distances"], scale=DBSCAN_SCALE
+        ),
+        "raspberry_pi.format_text_file": lambda: raspberry_pi.format_text_file(inputs["text"], output),
+        "jrt_bb2x.format_protocol_file": lambda: jrt_bb2x.format_protocol_file(inputs["protocol"], output),
+        "jrt_bb2x.format_ascii_file": lambda: jrt_bb2x.format_ascii_file(inputs["ascii"], output),
+        "jrt_bb2x_stream.format_stream_file": lambda: jrt_bb2x_stream.format_stream_file(
+            inputs["stream"], output
+        ),
+        "tof.format_excel_file": lambda: tof.format_excel_file(inputs["excel"], output),
+        "outdoor_graphs.scatter_time_vs_distance": lambda: plot(
+            outdoor_graphs.scatter_time_vs_distance, inputs["timings"], inputs["distances"]
+        ),
+        "outdoor_graphs.scatter_time_vs_distance[decimated]": lambda: plot(
+            outdoor_graphs.scatter_time_vs_distance,
+            inputs["timings"],
+            inputs["distances"],
+            intervals=3600,
+            decimate=True,
+        ),
+        "outdoor_graphs.scatter_clusters_with_dbscan": lambda: plot(
+            outdoor_graphs.scatter_clusters_with_dbscan, inputs["valid_timings"], inputs["valid_distances"]
+        ),
+        "outdoor_graphs.interactive_scatter": lambda: plot_interactive(inputs["timings"], inputs["distances"]),
+    }
+
+
+def measure(stage, repeat: int) -> dict:
+    """
+    Time a stage, then run it once more under tracemalloc to find its peak
+    memory, as tracing slows it down.
+
+    Args:
+        stage (Callable): The stage to run.
+        repeat (int): Number of timed runs, of which the fastest is kept.
+
+    Returns:
+        dict: The time in seconds and the peak memory in bytes.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every stage on synthetic rides.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="points in each ride")
+    parser.add_argument("--sensors", nargs="+", choices=list(synthetic.PROFILES), default=["lidar"])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGE_LIMITS), default=list(STAGE_LIMITS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each stage")
+    parser.add_argument("--no-limits", action="store_true", help="run every stage at every size")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic rides")
+    parser.add_argument("--output", type=Path, help="JSON results file, printed if not given")
+    args = parser.parse_args()
+
+    results = []
+    for sensor in args.sensors:
+        generator = synthetic.RideGenerator(sensor, seed=args.seed)
+        for points in args.sizes:
+            stages = [s for s in args.stages if args.no_limits or points <= STAGE_LIMITS[s]]
+            with tempfile.TemporaryDirectory() as folder:
+                folder = Path(folder)
+                output = folder / "output"
+                output.mkdir()
+                inputs = prepare(folder, generator, points, stages)
+                runners = get_stages(inputs, output)
+                for name in args.stages:
+                    result = {"stage": name, "sensor": sensor, "points": points}
+                    if name in stages:
+                        result.update(measure(runners[name], args.repeat))
+                    else:
+                        result["skipped"] = True
+                    results.append(result)
+                    print(json.dumps(result), file=sys.stderr)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
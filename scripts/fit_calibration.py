@@ -0,0 +1,31 @@
+import argparse
+from pathlib import Path
+
+from cycling_safety_analysis.data import calibration
+from cycling_safety_analysis.data.loader import FolderData
+
+# Base Directories
+BASE_DATA = Path("./data/processed")
+CALIBRATION_PATH = Path("./data/calibration.json")
+
+BASIC_TESTS_SUFFIX = "_basic_tests"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit calibration models to the basic tests.")
+    parser.add_argument("--kind", choices=calibration.KINDS, default="linear", help="model to fit")
+    parser.add_argument("--source", type=Path, default=BASE_DATA, help="processed data folder")
+    parser.add_argument("--output", type=Path, default=CALIBRATION_PATH, help="calibration file")
+    args = parser.parse_args()
+
+    # Each basic test folder, such as tof_basic_tests/indoors, holds one file
+    # for each interval of a sensor under a condition.
+    store = calibration.CalibrationStore(args.output)
+    for folder in sorted(args.source.glob(f"*{BASIC_TESTS_SUFFIX}/*")):
+        sensor = folder.parent.name.removesuffix(BASIC_TESTS_SUFFIX)
+        try:
+            model = calibration.fit(FolderData(folder).ragged_distances, args.kind)
+        except ValueError as error:
+            print(f"Skipped {sensor} {folder.name}: {error}")
+            continue
+        store.put(sensor, folder.name, model)
+        print(f"{sensor} {folder.name}: {model}")
@@ -1,35 +1,74 @@
 import datetime
 
 import numpy as np
-import pandas as pd
+from scipy import sparse
 from sklearn.cluster import DBSCAN
-from sklearn.metrics.pairwise import euclidean_distances
 from sklearn.preprocessing import MinMaxScaler
 
+from . import instrument, processing
 
+# Number of candidate neighbor pairs examined at a time when building the
+# radius neighbors graph. Bounds the temporary memory of the sweep.
+NEIGHBOR_BATCH = 1 << 22
+
+# One row of the table returned by summarize_passes. Times are in the same
+# integer units as the timestamps, such as milliseconds since midnight.
+PassEvent = np.dtype(
+    [
+        ("label", np.int64),
+        ("start", np.int64),
+        ("end", np.int64),
+        ("mean_time", np.int64),
+        ("min_distance", np.float64),
+        ("mean_distance", np.float64),
+        ("count", np.int64),
+        ("min_strength", np.float64),
+        ("mean_strength", np.float64),
+        ("max_strength", np.float64),
+    ]
+)
+
+
+@instrument.stage("analysis.find_clusters_DBSCAN", rows_in="distances", rows_out=len)
 def find_clusters_DBSCAN(
-    timestamps: list[int], distances: list[int], eps=0.02, min_samples=6
+    timestamps: list[int], distances: list[int], eps=0.02, min_samples=6, scale=None
 ) -> list[int]:
     """
     Uses DBSCAN to find clusters, assigning a cluster ID to each point.
 
+    Instead of a full n x n distance matrix, DBSCAN is given a sparse graph of
+    the pairs of points within eps of each other, found by sweeping over the
+    points in time order. Memory and time grow with the number of neighbors
+    rather than the square of the number of points, so long rides can be
+    clustered.
+
     Args:
         timestamps (list[int]): Time-series data of each point represented in
-                                integer format.
+                                integer format, such as milliseconds since
+                                midnight.
         distances (list[int]): Distance data of each point.
         eps (float, optional): Epsilon parameter of DBSCAN. Defaults to 0.02.
         min_samples (int, optional): min_samples parameter of DBSCAN. Defaults
                                      to 6.
+        scale (tuple, optional): Time and distance which are normalized to 1.
+                                 By default the range of each is normalized
+                                 to 1, which makes eps relative to the
+                                 length of the ride. Fixing the scale keeps
+                                 neighborhoods small on long rides. Defaults
+                                 to None.
 
     Returns:
         list[int]: THe cluster ID for each point.
     """
     X = np.column_stack((timestamps, distances))
-    scaler = MinMaxScaler()
-    X_normalized = scaler.fit_transform(X)
+    if scale is None:
+        scaler = MinMaxScaler()
+        X_normalized = scaler.fit_transform(X)
+    else:
+        X_normalized = X / np.asarray(scale, dtype=float)
     model = DBSCAN(eps=eps, min_samples=min_samples, metric="precomputed")
-    distance_matrix = euclidean_distances(X_normalized)
-    clusters = model.fit_predict(distance_matrix)
+    neighbors_graph = _radius_neighbors_graph(X_normalized, eps)
+    clusters = model.fit_predict(neighbors_graph)
     return clusters
 
 
@@ -37,22 +76,157 @@ def find_cluster_averages_DBSCAN(
     timings: list[datetime.datetime], distances: list[int], clusters: list[int]
 ) -> tuple[list]:
     """
-    Returns the average timings and distances for each cluster.
+    Returns the average timings and distances for each cluster. Noise points
+    are not a cluster and are left out.
 
     Args:
-        timings (list[datetime.datetime]): The time that each point was recorded.
+        timings (list[datetime.datetime]): The time that each point was
+                                           recorded, as datetime objects or
+                                           milliseconds since midnight.
         distances (list[int]): The distances of each point.
         clusters (list[int]): The cluster ID for each point.
 
     Returns:
-        tuple[list]: _description_
+        tuple[list]: The average timing and average distance of each cluster
+                     in order of cluster ID.
     """
-    df = pd.DataFrame(
-        {"timings": timings, "distances": distances, "clusters": clusters}
-    )
-    cluster_averages = (
-        df.groupby("clusters")
-        .agg({"timings": "mean", "distances": "mean"})
-        .reset_index()
+    timestamps = processing.to_milliseconds(timings)
+    passes = summarize_passes(timestamps, distances, clusters)
+    average_timings = passes["mean_time"]
+    if not np.issubdtype(np.asarray(timings).dtype, np.integer):
+        average_timings = average_timings.astype("datetime64[ms]").astype(object)
+    return average_timings.tolist(), passes["mean_distance"].tolist()
+
+
+@instrument.stage("analysis.summarize_passes", rows_in="distances", rows_out=len)
+def summarize_passes(
+    timestamps: list[int], distances: list[int], clusters: list[int], strengths=None
+) -> np.ndarray:
+    """
+    Summarize each cluster found by DBSCAN as a vehicle pass. The points are
+    sorted by cluster once and every statistic is reduced over the sorted
+    runs, rather than filtering the data once per cluster.
+
+    Args:
+        timestamps (list[int]): Time of each point in integer format, such as
+                                milliseconds since midnight.
+        distances (list[int]): Distance of each point.
+        clusters (list[int]): The cluster ID for each point, -1 for noise.
+        strengths (list[int], optional): Signal strength of each point. The
+                                         strength statistics are NaN if not
+                                         given. Defaults to None.
+
+    Returns:
+        np.ndarray: A PassEvent record for each cluster in order of cluster
+                    ID.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    distances = np.asarray(distances, dtype=np.float64)
+    clusters = np.asarray(clusters)
+    if strengths is None:
+        strengths = np.full(len(distances), np.nan)
+    strengths = np.asarray(strengths, dtype=np.float64)
+
+    members = np.flatnonzero(clusters != -1)
+    members = members[np.argsort(clusters[members], kind="stable")]
+    labels = clusters[members]
+    starts = np.flatnonzero(np.diff(labels, prepend=labels[:1] - 1))
+
+    passes = np.empty(len(starts), dtype=PassEvent)
+    if len(starts) == 0:
+        return passes
+
+    counts = np.diff(np.append(starts, len(members)))
+    times = timestamps[members]
+    passes["label"] = labels[starts]
+    passes["start"] = np.minimum.reduceat(times, starts)
+    passes["end"] = np.maximum.reduceat(times, starts)
+    passes["mean_time"] = np.round(np.add.reduceat(times, starts) / counts)
+    passes["min_distance"] = np.minimum.reduceat(distances[members], starts)
+    passes["mean_distance"] = np.add.reduceat(distances[members], starts) / counts
+    passes["count"] = counts
+    passes["min_strength"] = np.minimum.reduceat(strengths[members], starts)
+    passes["mean_strength"] = np.add.reduceat(strengths[members], starts) / counts
+    passes["max_strength"] = np.maximum.reduceat(strengths[members], starts)
+    return passes
+
+
+def _radius_neighbors_graph(X: np.ndarray, eps: float) -> sparse.csr_matrix:
+    """
+    Build a sparse graph of the distances between every pair of points which
+    are within eps of each other.
+
+    Points can only be neighbors if their times are within eps, so time is
+    cut into cells eps wide and the points are sorted by cell, then by
+    distance. The candidates of a point are then three contiguous runs of
+    the sorted points, one in each of the neighboring cells, found with a
+    binary search on distance.
+
+    Args:
+        X (np.ndarray): Points with time in the first column and distance in
+                        the second.
+        eps (float): Maximum distance between neighbors.
+
+    Returns:
+        sparse.csr_matrix: n x n graph where each row holds the distances to
+                           the neighbors of that point, itself included.
+    """
+    n = len(X)
+    # Pad the cells and search windows slightly so that rounding can never
+    # exclude a pair exactly eps apart; the exact distance is checked later.
+    margin = eps * 1e-6
+    cells = np.floor((X[:, 0] - X[:, 0].min()) / (eps + margin))
+    offsets = X[:, 1] - X[:, 1].min()
+    span = offsets.max() + 4 * eps + 1 if n else 1
+    keys = cells * span + offsets
+
+    order = np.argsort(keys, kind="stable")
+    points = X[order]
+    keys = keys[order]
+
+    starts, counts = [], []
+    for cell in (-1, 0, 1):
+        lower = keys + cell * span - eps - margin
+        upper = keys + cell * span + eps + margin
+        start = np.searchsorted(keys, lower, side="left")
+        starts.append(start)
+        counts.append(np.searchsorted(keys, upper, side="right") - start)
+    starts, counts = np.column_stack(starts), np.column_stack(counts)
+    cumulative = np.cumsum(counts.sum(axis=1))
+
+    rows, columns, weights = [], [], []
+    start = 0
+    while start < n:
+        # Take as many points as fit in a batch of candidate pairs.
+        done = cumulative[start - 1] if start else 0
+        stop = np.searchsorted(cumulative, done + NEIGHBOR_BATCH, side="right")
+        stop = max(stop, start + 1)
+
+        for window in range(3):
+            batch_counts = counts[start:stop, window]
+            row = np.repeat(np.arange(start, stop), batch_counts)
+            first = np.cumsum(batch_counts) - batch_counts
+            column = (
+                np.repeat(starts[start:stop, window] - first, batch_counts)
+                + np.arange(len(row))
+            )
+
+            weight = np.sqrt(((points[row] - points[column]) ** 2).sum(axis=1))
+            within = weight <= eps
+            rows.append(order[row[within]])
+            columns.append(order[column[within]])
+            weights.append(weight[within])
+        start = stop
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+    weights = np.concatenate(weights) if weights else np.empty(0)
+
+    # Sort each row by distance as DBSCAN expects of a precomputed graph.
+    # Zero distances are stored explicitly so that duplicate points still
+    # count as neighbors.
+    by_row = np.lexsort((weights, rows))
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n))))
+    return sparse.csr_matrix(
+        (weights[by_row], columns[by_row], indptr), shape=(n, n)
     )
-    return cluster_averages["timings"], cluster_averages["distances"]
@@ -0,0 +1,216 @@
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import analysis, cleaner, compression, instrument, loader, parser, session
+
+# Passes closer than this, in mm, are close passes.
+CLOSE_PASS_DISTANCE = 1500
+
+# Edges in mm of the bins of the distribution of pass distances.
+DISTANCE_BINS = (0, 500, 1000, 1500, 2000, 2500, 3000, 3500)
+
+# Function which cleans the distances of each sensor's rides, as in the
+# outdoor notebooks.
+SENSOR_CLEANERS = {
+    "lidar": cleaner.clean_tof_data,
+    "laser": cleaner.average_clusters,
+    "tof": cleaner.clean_tof_data,
+}
+
+OUTDOOR_TESTS_SUFFIX = "_outdoor_tests"
+
+_RIDE_SUFFIXES = (".txt", session.SUFFIX)
+
+
+def find_rides(folder_path: pathlib.Path) -> list[pathlib.Path]:
+    """
+    Find every ride in the outdoor test folders, such as
+    lidar_outdoor_tests/jurong_west_ride.txt.
+
+    Args:
+        folder_path (pathlib.Path): Processed data's folder path.
+
+    Returns:
+        list[pathlib.Path]: Path to each ride in sorted order.
+    """
+    return sorted(
+        file_path
+        for file_path in folder_path.glob(f"*{OUTDOOR_TESTS_SUFFIX}/*")
+        if compression.strip_suffix(file_path).suffix in _RIDE_SUFFIXES
+    )
+
+
+def get_sensor(file_path: pathlib.Path) -> str:
+    return file_path.parent.name.removesuffix(OUTDOOR_TESTS_SUFFIX)
+
+
+@instrument.stage("batch.analyze_ride")
+def analyze_ride(
+    file_path: pathlib.Path,
+    high=3500,
+    low=0,
+    clean="sensor",
+    calibration=None,
+    eps=0.02,
+    min_samples=6,
+    scale=None,
+) -> dict:
+    """
+    Load, filter, clean and cluster a single ride into vehicle passes. Points
+    without a timing cannot be clustered in time and are left out.
+
+    Args:
+        file_path (pathlib.Path): Path to the ride.
+        high (int, optional): Distances in mm above high are removed, as in
+                              cleaner.filter. Defaults to 3500.
+        low (int, optional): Distances in mm below low are removed. Defaults
+                             to 0.
+        clean (Callable, optional): Module level function which cleans an
+                                    array of distances, such as
+                                    cleaner.clean_tof_data. "sensor" uses
+                                    the function of the ride's sensor in
+                                    SENSOR_CLEANERS, and None does not
+                                    clean. Defaults to "sensor".
+        calibration (Calibration, optional): Model used to correct the
+                                             distances. Defaults to None.
+        eps (float, optional): Epsilon parameter of DBSCAN. Defaults to 0.02.
+        min_samples (int, optional): min_samples parameter of DBSCAN. Defaults
+                                     to 6.
+        scale (tuple, optional): Scale of time and distance, as in
+                                 analysis.find_clusters_DBSCAN. Defaults to
+                                 None.
+
+    Returns:
+        dict: The number of points used, the duration of the ride in
+              milliseconds and a PassEvent record for each pass.
+    """
+    timings, distances, strengths = loader.load_arrays_from_file(file_path, calibration=calibration)
+    distances = cleaner.filter(distances, high, low)
+    if clean == "sensor":
+        clean = SENSOR_CLEANERS.get(get_sensor(file_path))
+    if clean is not None:
+        distances = clean(distances)
+
+    valid = (distances != -1) & (timings != parser.NULL_TIMING)
+    timings, distances, strengths = timings[valid], distances[valid], strengths[valid]
+    duration = int(timings.max() - timings.min()) if len(timings) else 0
+
+    if len(distances) < min_samples:
+        passes = np.empty(0, dtype=analysis.PassEvent)
+    else:
+        clusters = analysis.find_clusters_DBSCAN(timings, distances, eps, min_samples, scale)
+        passes = analysis.summarize_passes(timings, distances, clusters, strengths)
+    return {"points": len(distances), "duration": duration, "passes": passes}
+
+
+def analyze_rides(
+    file_paths: list[pathlib.Path], max_workers=None, calibrations=None, **options
+) -> pd.DataFrame:
+    """
+    Analyze many rides across a process pool and summarize them in a single
+    table.
+
+    Args:
+        file_paths (list[pathlib.Path]): Path to each ride.
+        max_workers (int, optional): Number of processes to use. None uses
+                                     every CPU. Defaults to None.
+        calibrations (dict, optional): Calibration model of each sensor, such
+                                       as {"lidar": model}. Rides of other
+                                       sensors are not corrected. Defaults to
+                                       None.
+        **options: Other arguments of analyze_ride, such as high or clean.
+
+    Returns:
+        pd.DataFrame: A row for each ride and a final row for all rides, see
+                      summarize_rides.
+    """
+    calibrations = calibrations or {}
+    models = [calibrations.get(get_sensor(file_path)) for file_path in file_paths]
+    if max_workers == 1 or len(file_paths) <= 1:
+        results = [
+            analyze_ride(file_path, calibration=model, **options)
+            for file_path, model in zip(file_paths, models)
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            futures = [
+                executor.submit(analyze_ride, file_path, calibration=model, **options)
+                for file_path, model in zip(file_paths, models)
+            ]
+            results = [future.result() for future in futures]
+    return summarize_rides(file_paths, results)
+
+
+def summarize_rides(
+    file_paths: list[pathlib.Path], results: list[dict], bins=DISTANCE_BINS
+) -> pd.DataFrame:
+    """
+    Reduce the passes of each ride into a table of passing distances. The
+    distance of a pass is its mean distance, as in the outdoor notebooks.
+
+    Args:
+        file_paths (list[pathlib.Path]): Path to each ride.
+        results (list[dict]): Result of analyze_ride for each ride.
+        bins (tuple, optional): Edges in mm of the bins of the distribution
+                                of pass distances. Defaults to DISTANCE_BINS.
+
+    Returns:
+        pd.DataFrame: The sensor, points, duration in minutes, number of
+                      passes, number and share of close passes, the minimum,
+                      median and mean pass distance and the number of passes
+                      in each bin of each ride, indexed by sensor/ride. The
+                      final row, "all", is for every ride together.
+    """
+    rows = [
+        _summarize(get_sensor(file_path), **result, bins=bins)
+        for file_path, result in zip(file_paths, results)
+    ]
+    all_passes = [result["passes"] for result in results]
+    rows.append(
+        _summarize(
+            "all",
+            points=sum(result["points"] for result in results),
+            duration=sum(result["duration"] for result in results),
+            passes=np.concatenate(all_passes) if all_passes else np.empty(0, analysis.PassEvent),
+            bins=bins,
+        )
+    )
+    index = [f"{get_sensor(file_path)}/{file_path.name.split('.')[0]}" for file_path in file_paths]
+    index.append("all")
+    return pd.DataFrame(rows, index=pd.Index(index, name="ride"))
+
+
+def _summarize(sensor: str, points: int, duration: int, passes: np.ndarray, bins: tuple) -> dict:
+    """
+    Helper function that summarizes the passes of one or more rides.
+
+    Args:
+        sensor (str): Name of the sensor.
+        points (int): Number of points clustered.
+        duration (int): Duration in milliseconds.
+        passes (np.ndarray): PassEvent record of each pass.
+        bins (tuple): Edges in mm of the bins of the distribution.
+
+    Returns:
+        dict: A row of the summary table.
+    """
+    distances = passes["mean_distance"]
+    close_passes = int(np.count_nonzero(distances < CLOSE_PASS_DISTANCE))
+    row = {
+        "sensor": sensor,
+        "points": points,
+        "minutes": round(duration / 60_000, 2),
+        "passes": len(passes),
+        "close_passes": close_passes,
+        "close_share": round(close_passes / len(passes), 3) if len(passes) else np.nan,
+        "min_distance": distances.min() if len(passes) else np.nan,
+        "median_distance": np.median(distances) if len(passes) else np.nan,
+        "mean_distance": distances.mean() if len(passes) else np.nan,
+    }
+    counts, _ = np.histogram(distances, bins)
+    for low, high, count in zip(bins[:-1], bins[1:], counts):
+        row[f"{low}-{high}"] = int(count)
+    return row
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import pathlib
+
+import numpy as np
+
+from . import session
+
+DEFAULT_DIRECTORY = pathlib.Path.home() / ".cache" / "cycling_safety_analysis"
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+class ParseCache:
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES) -> None:
+        """
+        On-disk cache of parsed files. Entries are stored as session files and
+        are keyed on the path, size, modification time and content hash of
+        the source file, so editing or replacing a file never returns stale
+        data. The least recently used entries are evicted once the cache
+        grows past max_bytes.
+
+        Args:
+            directory (pathlib.Path, optional): Folder to store entries in.
+                                                Defaults to DEFAULT_DIRECTORY.
+            max_bytes (int, optional): Maximum total size of the entries.
+                                       Defaults to DEFAULT_MAX_BYTES.
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self._digests = {}
+
+    def get(self, file_path: pathlib.Path) -> tuple[np.ndarray]:
+        """
+        Get the cached arrays of a file.
+
+        Args:
+            file_path (pathlib.Path): Path to the source file.
+
+        Returns:
+            tuple[np.ndarray]: Memory-mapped timings, distances, and signal
+                               strengths, or None if the file is not cached.
+        """
+        entry = self._entry_path(file_path)
+        if not entry.exists():
+            return None
+        try:
+            data = session.Session(entry)[:]
+        except ValueError:
+            # Written by an older version of the session format.
+            entry.unlink(missing_ok=True)
+            return None
+        # Touch the entry so that eviction removes the least recently used.
+        os.utime(entry)
+        return data
+
+    def put(self, file_path: pathlib.Path, data: tuple[np.ndarray]) -> None:
+        """
+        Store the parsed arrays of a file, replacing any stale entries of the
+        same file.
+
+        Args:
+            file_path (pathlib.Path): Path to the source file.
+            data (tuple[np.ndarray]): Timings, distances, and signal strengths.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entry = self._entry_path(file_path)
+        self.invalidate(file_path)
+
+        temporary = entry.with_suffix(".tmp")
+        session.write_session(temporary, *data)
+        os.replace(temporary, entry)
+        self._evict()
+
+    def invalidate(self, file_path=None) -> None:
+        """
+        Remove the entries of a file, or every entry if no file is given.
+
+        Args:
+            file_path (pathlib.Path, optional): Path to the source file.
+                                                Defaults to None.
+        """
+        pattern = f"{_path_digest(file_path)}-*" if file_path else "*"
+        for entry in self.directory.glob(pattern + session.SUFFIX):
+            entry.unlink(missing_ok=True)
+
+    def _entry_path(self, file_path: pathlib.Path) -> pathlib.Path:
+        """
+        Get the path of the entry for the current contents of a file.
+
+        Args:
+            file_path (pathlib.Path): Path to the source file.
+
+        Returns:
+            pathlib.Path: Path to the cache entry.
+        """
+        stat = file_path.stat()
+        key = (str(file_path.resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = _content_digest(file_path)
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{stat.st_size}:{stat.st_mtime_ns}:".encode())
+        digest.update(self._digests[key])
+        name = f"{_path_digest(file_path)}-{digest.hexdigest()}{session.SUFFIX}"
+        return self.directory / name
+
+    def _evict(self) -> None:
+        """
+        Remove the least recently used entries until the cache fits in
+        max_bytes.
+        """
+        entries = []
+        for entry in self.directory.glob("*" + session.SUFFIX):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+
+
+def _path_digest(file_path: pathlib.Path) -> str:
+    return hashlib.blake2b(str(file_path.resolve()).encode(), digest_size=8).hexdigest()
+
+
+def _content_digest(file_path: pathlib.Path) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.digest()
@@ -0,0 +1,171 @@
+import json
+import os
+import pathlib
+
+import numpy as np
+
+from . import ragged
+
+# Actual distances in m that the basic tests were measured at.
+INTERVALS = [0.5 * i for i in range(1, 11)]
+
+KINDS = ("linear", "piecewise")
+
+
+class Calibration:
+    def __init__(self, kind: str, measured: list[float], actual: list[float]) -> None:
+        """
+        Model which maps the distances measured by a sensor to the actual
+        distances. A linear model is the best fit line of the measurements
+        against the actual distances, as drawn by basic_graphs.plot_line, and
+        is stored as its two end points. A piecewise model joins the mean
+        measurement at each interval to the actual distance of the interval,
+        and extends its first and last pieces past the ends.
+
+        Args:
+            kind (str): "linear" or "piecewise".
+            measured (list[float]): Measured distance of each knot, in
+                                    increasing order.
+            actual (list[float]): Actual distance of each knot.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"Unknown calibration kind {kind!r}.")
+        self.kind = kind
+        self.measured = np.asarray(measured, dtype=np.float64)
+        self.actual = np.asarray(actual, dtype=np.float64)
+        if len(self.measured) < 2 or len(self.measured) != len(self.actual):
+            raise ValueError("A calibration needs at least two knots.")
+        if np.any(np.diff(self.measured) <= 0):
+            raise ValueError("The measured distances of a calibration must increase.")
+
+    def __repr__(self) -> str:
+        return f"Calibration({self.kind!r}, {self.measured.tolist()}, {self.actual.tolist()})"
+
+    def apply(self, distances: np.ndarray) -> np.ndarray:
+        """
+        Correct distances in one vectorized step. Null distances of -1 are
+        left as they are.
+
+        Args:
+            distances (np.ndarray): Measured distances.
+
+        Returns:
+            np.ndarray: Corrected distances, as a new array.
+        """
+        distances = np.asarray(distances, dtype=np.float64)
+        # Index of the piece used for each distance, clipped so that the end
+        # pieces are extended.
+        pieces = np.clip(np.searchsorted(self.measured, distances) - 1, 0, len(self.measured) - 2)
+        x0, x1 = self.measured[pieces], self.measured[pieces + 1]
+        y0, y1 = self.actual[pieces], self.actual[pieces + 1]
+        corrected = y0 + (distances - x0) * (y1 - y0) / (x1 - x0)
+        return np.where(distances == -1, distances, corrected)
+
+    def rescale(self, factor: float) -> "Calibration":
+        """
+        Get the same model for distances in other units, such as 1000 to apply
+        a model fit in m to rides recorded in mm.
+
+        Args:
+            factor (float): Number of new units in each unit of the model.
+
+        Returns:
+            Calibration: The rescaled model.
+        """
+        return Calibration(self.kind, self.measured * factor, self.actual * factor)
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "measured": self.measured.tolist(), "actual": self.actual.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Calibration":
+        return cls(data["kind"], data["measured"], data["actual"])
+
+
+def fit(data: list[list], kind="linear", intervals=INTERVALS) -> Calibration:
+    """
+    Fit a calibration model to the measurements of a basic test. A piecewise
+    model cannot be fit if the mean measurement does not increase at every
+    interval, such as for a sensor which saturates, and raises a ValueError.
+
+    Args:
+        data (list[list]): data[i] is the distances measured at the ith
+                           interval, or a Ragged array of them.
+        kind (str, optional): "linear" or "piecewise". Defaults to "linear".
+        intervals (list[float], optional): Actual distance of each interval.
+                                           Defaults to INTERVALS.
+
+    Returns:
+        Calibration: The fitted model, in the units of the measurements.
+    """
+    data = ragged.Ragged.from_lists(data)
+    if len(data) != len(intervals):
+        raise ValueError(f"Expected {len(intervals)} intervals, got {len(data)}.")
+    actual = np.repeat(np.asarray(intervals, dtype=np.float64), data.lengths)
+
+    if kind == "linear":
+        m, b = np.polyfit(actual, data.values, deg=1)
+        ends = np.array([intervals[0], intervals[-1]], dtype=np.float64)
+        if m < 0:
+            ends = ends[::-1]
+        return Calibration(kind, m * ends + b, ends)
+    if kind == "piecewise":
+        means = data.mean()
+        if np.any(np.diff(means) <= 0):
+            raise ValueError("The mean measurement does not increase at every interval.")
+        return Calibration(kind, means, intervals)
+    raise ValueError(f"Unknown calibration kind {kind!r}.")
+
+
+class CalibrationStore:
+    def __init__(self, file_path: pathlib.Path) -> None:
+        """
+        JSON file of calibration models for each sensor and condition, such as
+        "tof" tested "indoors".
+
+        Args:
+            file_path (pathlib.Path): Path to the JSON file, which is created
+                                      when the first model is stored.
+        """
+        self.file_path = pathlib.Path(file_path)
+        self._models = {}
+        if self.file_path.exists():
+            self._models = json.loads(self.file_path.read_text())
+
+    def __contains__(self, key: tuple[str]) -> bool:
+        sensor, condition = key
+        return condition in self._models.get(sensor, {})
+
+    def keys(self) -> list[tuple[str]]:
+        return [(sensor, condition) for sensor, models in self._models.items() for condition in models]
+
+    def get(self, sensor: str, condition: str) -> Calibration:
+        """
+        Get the model of a sensor under a condition.
+
+        Args:
+            sensor (str): Name of the sensor.
+            condition (str): Name of the condition.
+
+        Returns:
+            Calibration: The stored model.
+        """
+        try:
+            return Calibration.from_dict(self._models[sensor][condition])
+        except KeyError:
+            raise KeyError(f"No calibration for {sensor} {condition}.") from None
+
+    def put(self, sensor: str, condition: str, model: Calibration) -> None:
+        """
+        Store the model of a sensor under a condition and save the file.
+
+        Args:
+            sensor (str): Name of the sensor.
+            condition (str): Name of the condition.
+            model (Calibration): The model.
+        """
+        self._models.setdefault(sensor, {})[condition] = model.to_dict()
+        self.file_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.file_path.with_name(f".{self.file_path.name}.tmp")
+        temporary.write_text(json.dumps(self._models, indent=2, sort_keys=True))
+        os.replace(temporary, self.file_path)
@@ -1,45 +1,56 @@
 import numpy as np
 
+from . import instrument, ragged
 
+NEIGHBOR_WINDOW = 2
+
+
+@instrument.stage("cleaner.clean_tof_data", rows_in="data", rows_out=len)
 def clean_tof_data(data: list[int]) -> list[int]:
     """
     Attempt to remove spurious data by removing standalone points.
 
     Args:
-        data (list[int]): List of distances.
+        data (list[int]): List or array of distances.
 
     Returns:
-        list[int]: Cleaned list of distances.
+        list[int]: Cleaned list of distances, or an array if given an array.
     """
-    cleaned_data = data.copy()
+    distances = np.asarray(data)
 
     # Remove points greater than 2.5m.
-    for i, distance in enumerate(cleaned_data):
-        if distance >= 2500:
-            cleaned_data[i] = -1
+    cleaned_data = np.where(distances >= 2500, -1, distances)
 
-    # Points must be clustered together to be considered a pass.
-    for i, distance in enumerate(cleaned_data):
-        if distance == -1:
-            continue
+    # Points must be clustered together to be considered a pass, so count the
+    # non -1 points within the window on either side of each point, itself
+    # included.
+    valid = cleaned_data != -1
+    totals = np.concatenate(([0], np.cumsum(valid)))
+    indices = np.arange(len(valid))
+    right = np.minimum(indices + NEIGHBOR_WINDOW + 1, len(valid))
+    left = np.maximum(indices - NEIGHBOR_WINDOW, 0)
+    neighbors = totals[right] - totals[left]
+    cleaned_data = np.where(valid & (neighbors > 1), cleaned_data, -1)
 
-        neighbors = _get_neighbors(cleaned_data, i)
-        if len(neighbors) <= 1:
-            cleaned_data[i] = -1
-
-    return cleaned_data
+    _count_rejected("cleaner.clean_tof_data.rejected", distances, cleaned_data)
+    return _like(data, cleaned_data)
 
 
+@instrument.stage("cleaner.clean_basic_test_data")
 def clean_basic_test_data(data: list[list]) -> list[list]:
     """
     Clean the measurements taken at each distance interval.
 
     Args:
-        data (list[list]): data[i] is the distances measured at the ith interval.
+        data (list[list]): data[i] is the distances measured at the ith interval,
+                           or a Ragged array of them.
 
     Returns:
-        list[list]: Return a list of clean measurements for each interval.
+        list[list]: Return a list of clean measurements for each interval, or a
+                    Ragged array if given a Ragged array.
     """
+    if isinstance(data, ragged.Ragged):
+        return data.clean_std()
     return [clean_std(measurements) for measurements in data]
 
 
@@ -65,19 +76,25 @@ def clean_std(data: list) -> list:
     return cleaned_array
 
 
+@instrument.stage("cleaner.filter", rows_in="data", rows_out=len)
 def filter(data: list[int], high: int, low=0) -> list[int]:
     """
     Filter all points above the given threshold.
 
     Args:
-        data (list[int]): List of distances.
+        data (list[int]): List or array of distances.
         high (int): No data above high.
         low (int): No data below low.
 
     Returns:
         list[int]: Distance data but all points above threshold now -1.
     """
-    return [i if low < i < high else -1 for i in data]
+    if isinstance(data, np.ndarray):
+        filtered = np.where((low < data) & (data < high), data, -1)
+    else:
+        filtered = [i if low < i < high else -1 for i in data]
+    _count_rejected("cleaner.filter.rejected", data, filtered)
+    return filtered
 
 
 def clean_laser_data(data: list[int]) -> list:
@@ -91,59 +108,75 @@ def clean_laser_data(data: list[int]) -> list:
     return cleaned_data
 
 
+@instrument.stage("cleaner.average_clusters", rows_in="distances", rows_out=len)
 def average_clusters(distances: list) -> list:
     """
     Given a list of distance measurements, a cluster is a contiguous subarray
     of non-null points. Average the values of all clusters.
 
     Args:
-        distances (list): List of distance measurements by the sensor.
+        distances (list): List or array of distance measurements by the
+                          sensor.
 
     Returns:
-        list: A list of equal length with the distance of clusters averaged.
+        list: A list of equal length with the distance of clusters averaged,
+              or an array if given an array.
     """
-    new_distances = distances.copy()
-    i = 0
-
-    # Loop through distances.
-    while i < len(distances):
-        # If cluster is encountered, iterate until the end of the cluster.
-        if distances[i] != -1:
-            j = i
-            while j < len(distances) - 1 and distances[j] != -1:
-                j += 1
-
-            # Find the mean of the cluster.
-            mean = np.mean([distances[k] for k in range(i, j)])
-
-            # Replace values in the cluster with the mean.
-            for k in range(i, j):
-                new_distances[k] = mean
-
-            # Move pointer i to the end of the cluster.
-            i = j
-
-        i += 1
-
-    return new_distances
-
-
-def _get_neighbors(data: list[int], index: int, window=2) -> list[int]:
+    values = np.asarray(distances, dtype=np.float64)
+    new_distances = values.copy()
+    if len(values) == 0:
+        return _like(distances, new_distances)
+
+    # Find the start and (exclusive) end of each run of non-null points.
+    valid = (values != -1).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], valid, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    # A cluster that runs to the end of the data has always excluded the last
+    # point from its average, which is kept to give the same results.
+    if len(ends) and ends[-1] == len(values):
+        ends[-1] -= 1
+    non_empty = ends > starts
+    starts, ends = starts[non_empty], ends[non_empty]
+    if len(starts) == 0:
+        return _like(distances, new_distances)
+
+    # Sum each cluster in one pass and replace its values with the mean.
+    lengths = ends - starts
+    sums = np.add.reduceat(values, np.column_stack((starts, ends)).ravel())[::2]
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    new_distances[offsets + np.arange(lengths.sum())] = np.repeat(sums / lengths, lengths)
+
+    return _like(distances, new_distances)
+
+
+def _like(data, result: np.ndarray):
     """
-    Get all non -1 neighbors of the point at index within left and right window.
+    Return the result in the same container type as the input data.
 
     Args:
-        data (list[int]): List of distances.
-        index (int): Index of current point.
-        window (int): Window to look for neighbors.
+        data: The data passed to the cleaning function.
+        result (np.ndarray): The cleaned data.
 
     Returns:
-        list[int]: Indices of the non -1 neighbors.
+        The cleaned data as a list if the input was a list, else an array.
     """
-    neighbors = []
+    if isinstance(data, np.ndarray):
+        return result
+    return result.tolist()
 
-    for i in range(max(0, index - window), min(len(data), index + window + 1)):
-        if data[i] != -1:
-            neighbors.append(i)
 
-    return neighbors
+def _count_rejected(name: str, data, result) -> None:
+    """
+    Count the points which were valid in data but are -1 in result, if
+    instrumentation is enabled.
+
+    Args:
+        name (str): Name of the counter.
+        data: The data passed to the cleaning function.
+        result: The cleaned data.
+    """
+    if instrument.enabled():
+        rejected = (np.asarray(data) != -1) & (np.asarray(result) == -1)
+        instrument.count(name, int(np.count_nonzero(rejected)))
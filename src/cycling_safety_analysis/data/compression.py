@@ -0,0 +1,52 @@
+import bz2
+import gzip
+import lzma
+import pathlib
+
+_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+# Suffixes of the compressed files which can be read and written.
+SUFFIXES = tuple(_OPENERS)
+
+
+def open_file(file_path: pathlib.Path, mode="r", compression=None, **kwargs):
+    """
+    Open a file, decompressing or compressing it as it is streamed if it is
+    a .gz, .bz2 or .xz file. Text modes work the same as the built in open.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+        mode (str, optional): Mode as in the built in open. Defaults to "r".
+        compression (str, optional): Compression suffix to use, such as
+                                     ".gz", instead of the one of file_path.
+                                     Defaults to None.
+        **kwargs: Other arguments of open, such as encoding.
+
+    Returns:
+        A file object.
+    """
+    suffix = compression or pathlib.Path(file_path).suffix
+    if suffix not in _OPENERS:
+        return open(file_path, mode, **kwargs)
+    if "b" not in mode and "t" not in mode:
+        # The compressed openers default to binary mode.
+        mode += "t"
+    return _OPENERS[suffix](file_path, mode, **kwargs)
+
+
+def is_compressed(file_path: pathlib.Path) -> bool:
+    return pathlib.Path(file_path).suffix in _OPENERS
+
+
+def strip_suffix(file_path: pathlib.Path) -> pathlib.Path:
+    """
+    Remove the compression suffix of a path, such as ride.txt.gz to ride.txt.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+
+    Returns:
+        pathlib.Path: The path without a compression suffix.
+    """
+    file_path = pathlib.Path(file_path)
+    return file_path.with_suffix("") if is_compressed(file_path) else file_path
@@ -0,0 +1,239 @@
+import math
+
+import numpy as np
+
+# Relative slack when deciding that no future point can be within eps, so that
+# rounding can only ever delay a decision and never make a wrong one.
+_SLACK = 1 + 1e-9
+
+
+class _Point:
+    __slots__ = ("index", "u", "v", "count", "neighbors", "core")
+
+    def __init__(self, index: int, u: float, v: float) -> None:
+        self.index = index
+        self.u = u
+        self.v = v
+        self.count = 1
+        self.neighbors = []
+        self.core = False
+
+
+class _Cluster:
+    __slots__ = ("first", "earliest", "latest", "cores", "candidates")
+
+    def __init__(self, point: _Point) -> None:
+        self.first = point.index
+        self.earliest = point.u
+        self.latest = point.u
+        self.cores = [point.index]
+        self.candidates = {}
+
+
+class PassDetector:
+    def __init__(self, scale: tuple, eps=0.02, min_samples=6, max_delay=0) -> None:
+        """
+        Incremental DBSCAN over a live stream of readings. Readings must
+        arrive in time order, give or take max_delay, and only the readings
+        within a few eps of the latest one are kept, so memory stays constant
+        however long the ride is. A pass is emitted once no future reading
+        could join it.
+
+        Passes are emitted in the same order, with the same points, as
+        analysis.find_clusters_DBSCAN(timestamps, distances, eps,
+        min_samples, scale) gives on the same readings.
+
+        Args:
+            scale (tuple): Time and distance which are normalized to 1, such
+                           as (75000, 5000) for milliseconds and millimetres.
+            eps (float, optional): Epsilon parameter of DBSCAN. Defaults to
+                                   0.02.
+            min_samples (int, optional): min_samples parameter of DBSCAN.
+                                         Defaults to 6.
+            max_delay (int, optional): How far a reading may be behind the
+                                       latest one, as the sensor logs can
+                                       jitter by a second. Defaults to 0.
+        """
+        self.time_scale, self.distance_scale = (float(s) for s in scale)
+        self.eps = eps
+        self.min_samples = min_samples
+        self.max_delay = max_delay
+        self._count = 0
+        self._latest = -math.inf
+        self._now = -math.inf
+        self._active = []
+        self._parents = {}
+        self._clusters = {}
+        self._claimed = {}
+
+    def add(self, timestamp: int, distance: float) -> list[np.ndarray]:
+        """
+        Add a single reading. Readings with a distance of -1 are not points,
+        but still advance the clock.
+
+        Args:
+            timestamp (int): Time of the reading, such as milliseconds since
+                             midnight.
+            distance (float): Distance of the reading.
+
+        Returns:
+            list[np.ndarray]: Indices of the readings in each pass which has
+                              finished, in the order they were added.
+        """
+        if timestamp < self._latest - self.max_delay:
+            raise ValueError("Readings must be added in time order.")
+        index = self._count
+        self._count += 1
+        self._latest = max(self._latest, timestamp)
+        # No reading from now on can be earlier than this.
+        self._now = (self._latest - self.max_delay) / self.time_scale
+
+        active = []
+        for point in self._active:
+            if self._now - point.u <= self.eps * _SLACK:
+                active.append(point)
+            else:
+                # The point can gain no more neighbors. Dropping its links
+                # stops old points being kept alive through chains of them.
+                point.neighbors = []
+        self._active = active
+
+        if distance != -1:
+            u = timestamp / self.time_scale
+            self._add_point(_Point(index, u, distance / self.distance_scale))
+        return self._emit()
+
+    def update(self, timestamps: list[int], distances: list[float]) -> list[np.ndarray]:
+        """
+        Add a batch of readings.
+
+        Args:
+            timestamps (list[int]): Time of each reading.
+            distances (list[float]): Distance of each reading.
+
+        Returns:
+            list[np.ndarray]: Indices of the readings in each pass which has
+                              finished.
+        """
+        passes = []
+        timestamps, distances = np.asarray(timestamps).tolist(), np.asarray(distances).tolist()
+        for timestamp, distance in zip(timestamps, distances):
+            passes.extend(self.add(timestamp, distance))
+        return passes
+
+    def flush(self) -> list[np.ndarray]:
+        """
+        End the stream, emitting every pass which is still open.
+
+        Returns:
+            list[np.ndarray]: Indices of the readings in each remaining pass.
+        """
+        self._now = math.inf
+        self._active = []
+        return self._emit()
+
+    def _add_point(self, point: _Point) -> None:
+        """
+        Link a new point to its neighbors and update core points and clusters.
+
+        Args:
+            point (_Point): The new point.
+        """
+        for other in self._active:
+            du = point.u - other.u
+            dv = point.v - other.v
+            if math.sqrt(du * du + dv * dv) > self.eps:
+                continue
+            point.neighbors.append(other)
+            other.neighbors.append(point)
+            point.count += 1
+            other.count += 1
+            if other.core:
+                self._add_candidate(self._find(other.index), point)
+        self._active.append(point)
+
+        for other in [point] + point.neighbors:
+            if not other.core and other.count >= self.min_samples:
+                self._make_core(other)
+
+    def _make_core(self, point: _Point) -> None:
+        """
+        Mark a point as a core point, starting a cluster and merging it with
+        the clusters of its core neighbors.
+
+        Args:
+            point (_Point): Point which now has at least min_samples neighbors.
+        """
+        point.core = True
+        self._parents[point.index] = point.index
+        cluster = self._clusters[point.index] = _Cluster(point)
+        for neighbor in point.neighbors:
+            self._add_candidate(cluster, neighbor)
+        for neighbor in point.neighbors:
+            if neighbor.core:
+                self._union(point.index, neighbor.index)
+
+    def _add_candidate(self, cluster: _Cluster, point: _Point) -> None:
+        cluster.candidates[point.index] = point.u
+        cluster.earliest = min(cluster.earliest, point.u)
+        cluster.latest = max(cluster.latest, point.u)
+
+    def _find(self, index: int) -> _Cluster:
+        root = index
+        while self._parents[root] != root:
+            root = self._parents[root]
+        while self._parents[index] != root:
+            self._parents[index], index = root, self._parents[index]
+        return self._clusters[root]
+
+    def _union(self, a: int, b: int) -> None:
+        first, second = self._find(a), self._find(b)
+        if first is second:
+            return
+        if second.first < first.first:
+            first, second = second, first
+        self._parents[second.first] = first.first
+        del self._clusters[second.first]
+        first.earliest = min(first.earliest, second.earliest)
+        first.latest = max(first.latest, second.latest)
+        first.cores.extend(second.cores)
+        first.candidates.update(second.candidates)
+
+    def _emit(self) -> list[np.ndarray]:
+        """
+        Emit finished clusters in the order DBSCAN labels them. A cluster is
+        finished once its core points and their neighbors are all too old
+        for a new point to be their neighbor. Border points shared with
+        other clusters go to the cluster which was started first.
+
+        Returns:
+            list[np.ndarray]: Indices of the readings in each finished pass.
+        """
+        passes = []
+        while self._clusters:
+            first = min(self._clusters)
+            cluster = self._clusters[first]
+            if self._now - cluster.latest <= self.eps * _SLACK:
+                break
+            # An earlier reading could still become a core point, starting a
+            # cluster which DBSCAN would label first.
+            if any(not p.core and p.index < first for p in self._active):
+                break
+
+            del self._clusters[first]
+            members = set(cluster.cores)
+            for index, u in cluster.candidates.items():
+                if index not in members and index not in self._claimed:
+                    members.add(index)
+                    self._claimed[index] = u
+            for index in cluster.cores:
+                del self._parents[index]
+            passes.append(np.array(sorted(members)))
+
+            # Borders can only be claimed again by an open cluster which reaches
+            # back to them, or by a point which is still open becoming a core
+            # point, and open points are at most eps older than now.
+            earliest = min((c.earliest for c in self._clusters.values()), default=math.inf)
+            earliest = min(earliest, self._now - 2 * self.eps * _SLACK)
+            self._claimed = {i: u for i, u in self._claimed.items() if u >= earliest}
+        return passes
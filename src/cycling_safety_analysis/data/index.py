@@ -0,0 +1,196 @@
+import datetime
+import pathlib
+
+import numpy as np
+
+from . import loader, parser
+
+
+class RideIndex:
+    def __init__(self, timings: np.ndarray, distances: np.ndarray, strengths: np.ndarray) -> None:
+        """
+        Index a ride on its time column so that time windows, the nearest
+        sample to a time and gaps in the recording are found by binary search.
+        Windows are returned as views of the columns rather than copies.
+
+        Unknown timings of -1 are given the timing of the sample before them,
+        or of the first known sample if they start the ride, which keeps the
+        time column sorted. If no timing is known, every sample is at 0. If
+        the known timings are not in order, such as when the clock of the
+        logger jitters, the columns are sorted by time once here.
+
+        Args:
+            timings (np.ndarray): Milliseconds since midnight, -1 if unknown.
+            distances (np.ndarray): Distance of each sample.
+            strengths (np.ndarray): Signal strength of each sample.
+        """
+        timings = np.asarray(timings, dtype=np.int64)
+        self.known = timings != parser.NULL_TIMING
+        if not self.known.all():
+            timings = _forward_fill(timings, self.known)
+
+        if np.any(np.diff(timings) < 0):
+            order = np.argsort(timings, kind="stable")
+            timings = timings[order]
+            distances, strengths = np.asarray(distances)[order], np.asarray(strengths)[order]
+            self.known = self.known[order]
+
+        self.timings = timings
+        self.distances = distances
+        self.strengths = strengths
+        self._steps = None
+
+    @classmethod
+    def from_file(cls, file_path: pathlib.Path, clean=True, cache=None) -> "RideIndex":
+        """
+        Index a text or session file, see loader.load_arrays_from_file.
+
+        Args:
+            file_path (pathlib.Path): Path to file.
+            clean (bool, optional): If true, remove points with invalid
+                                    distance measurements. Defaults to True.
+            cache (ParseCache, optional): Cache of parsed files. Defaults to
+                                          None.
+
+        Returns:
+            RideIndex: The index of the ride.
+        """
+        return cls(*loader.load_arrays_from_file(file_path, clean, cache))
+
+    def __len__(self) -> int:
+        return len(self.timings)
+
+    @property
+    def start(self) -> int:
+        return int(self.timings[0]) if len(self) else parser.NULL_TIMING
+
+    @property
+    def end(self) -> int:
+        return int(self.timings[-1]) if len(self) else parser.NULL_TIMING
+
+    def slice(self, start=None, end=None) -> slice:
+        """
+        Find the samples between two times, both included.
+
+        Args:
+            start (optional): Time of day, see to_milliseconds. None is the
+                              start of the ride. Defaults to None.
+            end (optional): Time in the same forms. None is the end of the
+                            ride. Defaults to None.
+
+        Returns:
+            slice: The positions of the samples.
+        """
+        first = 0 if start is None else np.searchsorted(self.timings, to_milliseconds(start), "left")
+        last = len(self) if end is None else np.searchsorted(self.timings, to_milliseconds(end), "right")
+        return slice(int(first), int(max(first, last)))
+
+    def range(self, start=None, end=None) -> tuple[np.ndarray]:
+        """
+        Get the samples between two times, both included, as views.
+
+        Args:
+            start (optional): Start time, as in slice. Defaults to None.
+            end (optional): End time, as in slice. Defaults to None.
+
+        Returns:
+            tuple[np.ndarray]: Timings, distances, and signal strengths.
+        """
+        window = self.slice(start, end)
+        return self.timings[window], self.distances[window], self.strengths[window]
+
+    def nearest(self, time) -> int:
+        """
+        Find the sample taken nearest to a time. Ties go to the earlier
+        sample.
+
+        Args:
+            time: Time, as in slice.
+
+        Returns:
+            int: Position of the sample, or -1 if the ride is empty.
+        """
+        if len(self) == 0:
+            return -1
+        time = to_milliseconds(time)
+        after = int(np.searchsorted(self.timings, time, "left"))
+        if after == len(self):
+            return after - 1
+        if after == 0:
+            return 0
+        before = after - 1
+        return before if time - self.timings[before] <= self.timings[after] - time else after
+
+    def gaps(self, min_gap: int, start=None, end=None) -> np.ndarray:
+        """
+        Find where the recording stops for longer than min_gap, such as when
+        the sensor drops out. Only known timings are compared, so runs of
+        unknown timings never hide or make up a gap.
+
+        Args:
+            min_gap (int): Shortest gap to find, in milliseconds.
+            start (optional): Only find gaps which begin at or after this
+                              time, as in slice. Defaults to None.
+            end (optional): Only find gaps which end at or before this time.
+                            Defaults to None.
+
+        Returns:
+            np.ndarray: Rows of the start and end time of each gap.
+        """
+        times, steps = self._known_steps()
+        first = 0 if start is None else np.searchsorted(times, to_milliseconds(start), "left")
+        last = len(steps) if end is None else np.searchsorted(times, to_milliseconds(end), "right") - 1
+        found = first + np.flatnonzero(steps[first:max(first, last)] > min_gap)
+        return np.column_stack((times[found], times[found + 1]))
+
+    def _known_steps(self) -> tuple[np.ndarray]:
+        """
+        Get the known timings and the step from each to the next, computed
+        the first time they are needed.
+
+        Returns:
+            tuple[np.ndarray]: Known timings and the steps between them.
+        """
+        if self._steps is None:
+            times = self.timings if self.known.all() else self.timings[self.known]
+            self._steps = times, np.diff(times)
+        return self._steps
+
+
+def to_milliseconds(time) -> int:
+    """
+    Convert a time of day to milliseconds since midnight.
+
+    Args:
+        time: Milliseconds since midnight, a string such as "HH:MM" or
+              "HH:MM:SS[.mmm]", or a datetime.time or datetime.datetime.
+
+    Returns:
+        int: Milliseconds since midnight.
+    """
+    if isinstance(time, str):
+        time = datetime.time.fromisoformat(time)
+    if isinstance(time, datetime.datetime):
+        time = time.time()
+    if isinstance(time, datetime.time):
+        return ((time.hour * 60 + time.minute) * 60 + time.second) * 1000 + time.microsecond // 1000
+    return int(time)
+
+
+def _forward_fill(timings: np.ndarray, known: np.ndarray) -> np.ndarray:
+    """
+    Give each unknown timing the timing of the last known sample before it,
+    or of the first known sample if there is none.
+
+    Args:
+        timings (np.ndarray): Milliseconds since midnight, -1 if unknown.
+        known (np.ndarray): Whether each timing is known.
+
+    Returns:
+        np.ndarray: The filled timings.
+    """
+    if not known.any():
+        return np.zeros_like(timings)
+    last_known = np.maximum.accumulate(np.where(known, np.arange(len(timings)), -1))
+    last_known[last_known < 0] = np.argmax(known)
+    return timings[last_known]
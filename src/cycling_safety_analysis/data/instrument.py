@@ -0,0 +1,315 @@
+import contextlib
+import functools
+import inspect
+import json
+import pathlib
+import time
+import tracemalloc
+from collections.abc import Iterable, Iterator
+
+# The recorder while instrumentation is enabled. Instrumented functions only
+# check this when it is None, so they cost nothing extra when disabled.
+_recorder = None
+
+
+class StageRecord:
+    def __init__(self) -> None:
+        """
+        Totals of every call of an instrumented stage.
+        """
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_bytes = None
+        self.rows_in = None
+        self.rows_out = None
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Recorder:
+    def __init__(self, track_memory=False) -> None:
+        """
+        Collect the time, peak allocation and row counts of each stage and
+        the value of each counter. Stages may be nested, and each one is
+        measured including the stages it calls. Only the current process is
+        recorded, not the workers of a process pool.
+
+        Args:
+            track_memory (bool, optional): If true, trace allocations to find
+                                           the peak of each stage, which
+                                           slows every stage down. Defaults
+                                           to False.
+        """
+        self.track_memory = track_memory
+        self.stages = {}
+        self.counters = {}
+        # Allocated bytes at the start of each open stage, and the highest
+        # peak of the stages nested in it.
+        self._memory = []
+        self._started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator["_Call"]:
+        """
+        Measure a stage.
+
+        Args:
+            name (str): Name of the stage, such as "cleaner.filter".
+
+        Yields:
+            _Call: Set rows_in and rows_out on it to count the rows.
+        """
+        call = _Call()
+        if self.track_memory:
+            self._start_memory()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield call
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            peak = self._stop_memory() if self.track_memory else None
+            self._add(name, wall, cpu, peak, call)
+
+    def count(self, name: str, value=1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {name: record.to_dict() for name, record in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def _start_memory(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._memory:
+            # The peak is reset for this stage, so keep the peak of the stage
+            # it is nested in so far.
+            self._memory[-1][1] = max(self._memory[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._memory.append([current, 0])
+
+    def _stop_memory(self) -> int:
+        start, nested_peak = self._memory.pop()
+        peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+        if self._memory:
+            self._memory[-1][1] = max(self._memory[-1][1], peak)
+        elif self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return peak - start
+
+    def _add(self, name: str, wall: float, cpu: float, peak: int, call: "_Call") -> None:
+        record = self.stages.setdefault(name, StageRecord())
+        record.calls += 1
+        record.wall_seconds += wall
+        record.cpu_seconds += cpu
+        if peak is not None:
+            record.peak_bytes = max(record.peak_bytes or 0, peak)
+        if call.rows_in is not None:
+            record.rows_in = (record.rows_in or 0) + call.rows_in
+        if call.rows_out is not None:
+            record.rows_out = (record.rows_out or 0) + call.rows_out
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.rows_in = None
+        self.rows_out = None
+
+
+def enable(track_memory=False) -> Recorder:
+    """
+    Start recording every instrumented stage, replacing any earlier records.
+
+    Args:
+        track_memory (bool, optional): If true, record the peak allocation of
+                                       each stage. Defaults to False.
+
+    Returns:
+        Recorder: The new recorder.
+    """
+    global _recorder
+    _recorder = Recorder(track_memory)
+    return _recorder
+
+
+def disable() -> Recorder:
+    """
+    Stop recording.
+
+    Returns:
+        Recorder: The recorder that was in use, or None.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+@contextlib.contextmanager
+def recording(track_memory=False) -> Iterator[Recorder]:
+    """
+    Record the instrumented stages run inside a with block.
+
+    Args:
+        track_memory (bool, optional): If true, record the peak allocation of
+                                       each stage. Defaults to False.
+
+    Yields:
+        Recorder: The recorder, which keeps its records after the block.
+    """
+    recorder = enable(track_memory)
+    try:
+        yield recorder
+    finally:
+        disable()
+
+
+def stage(name: str, rows_in=None, rows_out=None):
+    """
+    Decorator which records each call of a function as a stage while
+    instrumentation is enabled.
+
+    Args:
+        name (str): Name of the stage, such as "cleaner.filter".
+        rows_in (str, optional): Name of the argument whose length is the
+                                 number of rows in. Defaults to None.
+        rows_out (Callable, optional): Given the result, returns the number
+                                       of rows out. Defaults to None.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with _recorder.stage(name) as call:
+                if rows_in is not None:
+                    call.rows_in = _length(signature.bind(*args, **kwargs).arguments.get(rows_in))
+                result = function(*args, **kwargs)
+                if rows_out is not None:
+                    call.rows_out = rows_out(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, value=1) -> None:
+    """
+    Add to a counter, such as the number of points rejected by a filter.
+
+    Args:
+        name (str): Name of the counter.
+        value (int, optional): Amount to add. Defaults to 1.
+    """
+    if _recorder is not None:
+        _recorder.count(name, value)
+
+
+def count_rows(name: str, blocks: Iterable[list]) -> Iterator[list]:
+    """
+    Count the rows of blocks as they are streamed, if instrumentation is
+    enabled.
+
+    Args:
+        name (str): Name of the counter.
+        blocks (Iterable[list]): Blocks of rows.
+
+    Returns:
+        Iterator[list]: The same blocks.
+    """
+    if _recorder is None:
+        return blocks
+    return (_counted(name, block) for block in blocks)
+
+
+def columns_length(columns: tuple) -> int:
+    return len(columns[0])
+
+
+def to_json(recorder=None, file_path=None) -> str:
+    """
+    Export the records as JSON.
+
+    Args:
+        recorder (Recorder, optional): Defaults to the current recorder.
+        file_path (pathlib.Path, optional): If given, also write the JSON to
+                                            this file. Defaults to None.
+
+    Returns:
+        str: The JSON.
+    """
+    text = json.dumps(_get(recorder).to_dict(), indent=2)
+    if file_path is not None:
+        pathlib.Path(file_path).write_text(text)
+    return text
+
+
+def report(recorder=None) -> str:
+    """
+    Format the records as a plain text table, slowest stage first.
+
+    Args:
+        recorder (Recorder, optional): Defaults to the current recorder.
+
+    Returns:
+        str: The report.
+    """
+    recorder = _get(recorder)
+    header = ("stage", "calls", "wall s", "cpu s", "peak MB", "rows in", "rows out")
+    rows = [header]
+    stages = sorted(recorder.stages.items(), key=lambda item: item[1].wall_seconds, reverse=True)
+    for name, record in stages:
+        peak = "" if record.peak_bytes is None else f"{record.peak_bytes / 2**20:.1f}"
+        rows.append(
+            (
+                name,
+                str(record.calls),
+                f"{record.wall_seconds:.3f}",
+                f"{record.cpu_seconds:.3f}",
+                peak,
+                "" if record.rows_in is None else str(record.rows_in),
+                "" if record.rows_out is None else str(record.rows_out),
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    lines = []
+    for name, *cells in rows:
+        cells = [cell.rjust(width) for cell, width in zip(cells, widths[1:])]
+        lines.append("  ".join([name.ljust(widths[0]), *cells]))
+    lines.extend(f"{name}: {value}" for name, value in sorted(recorder.counters.items()))
+    return "\n".join(lines)
+
+
+def _get(recorder) -> Recorder:
+    recorder = recorder or _recorder
+    if recorder is None:
+        raise ValueError("Instrumentation is not enabled.")
+    return recorder
+
+
+def _counted(name: str, block: list) -> list:
+    count(name, len(block))
+    return block
+
+
+def _length(value) -> int:
+    try:
+        return len(value)
+    except TypeError:
+        return None
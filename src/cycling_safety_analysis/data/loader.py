@@ -1,101 +1,381 @@
-import datetime
+import itertools
 import pathlib
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 
-from . import cleaner
+import numpy as np
+
+from . import cleaner, compression, instrument, parser, ragged, session
+
+CHUNK_SIZE = 65536
 
 
 class FolderData:
-    def __init__(self, folder_path: pathlib.Path) -> None:
+    def __init__(self, folder_path: pathlib.Path, cache=None) -> None:
         """
-        Initialize attributes to store data from folder.
+        Index the files in a folder. Each file is only parsed the first time
+        its data is accessed, or in bulk by prefetch.
 
         Args:
             folder_path (pathlib.Path): Path to folder to load data from.
+            cache (ParseCache, optional): Cache of parsed files. Defaults to
+                                          None.
         """
         self.folder_path = folder_path
-        self.timings = []
-        self.distances = []
-        self.signal_strengths = []
-        self.load_data()
+        self.cache = cache
+        self.file_paths = sorted(folder_path.iterdir())
+        self._data = [None] * len(self.file_paths)
+
+    def __len__(self) -> int:
+        return len(self.file_paths)
+
+    def __getitem__(self, index: int) -> list[list]:
+        """
+        Get the data of a single file, parsing it if it has not been loaded.
+
+        Args:
+            index (int): Index of the file in sorted order.
+
+        Returns:
+            list[list]: Timings, distances, and signal strengths of the file.
+        """
+        if self._data[index] is None:
+            self._data[index] = load_data_from_file(self.file_paths[index], cache=self.cache)
+        return self._data[index]
+
+    @property
+    def timings(self) -> list[list]:
+        return [self[i][0] for i in range(len(self))]
+
+    @property
+    def distances(self) -> list[list]:
+        return [self[i][1] for i in range(len(self))]
+
+    @property
+    def signal_strengths(self) -> list[list]:
+        return [self[i][2] for i in range(len(self))]
+
+    @property
+    def ragged_distances(self) -> ragged.Ragged:
+        """
+        Get the distances of every file as a ragged array. The files are
+        loaded as arrays, which are joined with their lengths as offsets,
+        rather than through the lists of load_data_from_file.
+
+        Returns:
+            ragged.Ragged: The distances of each file.
+        """
+        distances = [load_arrays_from_file(file_path, cache=self.cache)[1] for file_path in self.file_paths]
+        return ragged.Ragged.from_lists(distances)
 
     def load_data(self) -> None:
         """
         Load data from each files into the respective attributes.
         """
-        self.timings, self.distances, self.signal_strengths = load_data_from_folder(
-            self.folder_path
+        self.prefetch()
+
+    def prefetch(self, max_workers=None) -> list[list[list]]:
+        """
+        Parse every file which has not been loaded yet across a process pool.
+
+        Args:
+            max_workers (int, optional): Number of processes to use. Defaults
+                                         to the number of CPUs.
+
+        Returns:
+            list[list[list]]: The data of each file in sorted order.
+        """
+        missing = [i for i, data in enumerate(self._data) if data is None]
+        loaded = _load_files(
+            [self.file_paths[i] for i in missing], max_workers, self.cache
         )
+        for i, data in zip(missing, loaded):
+            self._data[i] = data
+        return list(self._data)
 
 
-def load_data_from_folder(folder_path: pathlib.Path) -> list[list[list]]:
+def load_data_from_folder(
+    folder_path: pathlib.Path, max_workers=1, cache=None
+) -> list[list[list]]:
     """
     Extract the data from each file in the folder.
 
     Args:
         folder_path (pathlib.Path): Path to folder.
+        max_workers (int, optional): Number of processes used to parse the
+                                     files. None uses every CPU. Defaults to
+                                     1.
+        cache (ParseCache, optional): Cache of parsed files. Defaults to None.
 
     Returns:
         list[list[list]]: A list containing the data of each file.
     """
-    data = []
-
-    for file_path in sorted(folder_path.iterdir()):
-        timing, distance, signal_strength = load_data_from_file(file_path)
-        data.append((timing, distance, signal_strength))
-
+    data = _load_files(sorted(folder_path.iterdir()), max_workers, cache)
     return [list(i) for i in zip(*data)]
 
 
-def filter_data_from_file(file_path: pathlib.Path, high=3500, low=0) -> tuple[list]:
+def filter_data_from_file(
+    file_path: pathlib.Path, high=3500, low=0, cache=None, calibration=None
+) -> tuple[list]:
     """
     Helper function that extracts data from file.
 
     Args:
         file_path (pathlib.Path): Data file.
+        cache (ParseCache, optional): Cache of parsed files. Defaults to None.
+        calibration (Calibration, optional): Model used to correct the
+                                             distances before they are
+                                             filtered. Defaults to None.
 
     Returns:
         tuple[list]: Returns timings, distances, and signal strengths.
     """
-    timings, distances, strengths = load_data_from_file(file_path)
+    timings, distances, strengths = load_data_from_file(
+        file_path, cache=cache, calibration=calibration
+    )
     distances = cleaner.filter(distances, high, low)
     return timings, distances, strengths
 
 
-def load_data_from_file(file_path: pathlib.Path, clean=True) -> list[list]:
+@instrument.stage("loader.load_data_from_file", rows_out=instrument.columns_length)
+def load_data_from_file(
+    file_path: pathlib.Path, clean=True, cache=None, calibration=None
+) -> list[list]:
     """
     Given a file that stores data from the sensor in a standard format
     speicified in format_data.py, extract the distances, timings, and
     signal strengths.
 
+    This is a compatibility layer over load_arrays_from_file which returns
+    lists with timings as datetime objects, as expected by the notebooks.
+
     Args:
         file_path (pathlib.Path): Path to file.
         clean (bool, optional): If true, remove points with invalid
                                 distance measurements. Defaults to True.
+        cache (ParseCache, optional): Cache of parsed files. Defaults to None.
+        calibration (Calibration, optional): Model used to correct the
+                                             distances. Defaults to None.
 
     Returns:
         list[list]: Returns three lists: timings, distances, and signal
                     strengths respectively.
     """
-    data = []
+    return parser.to_legacy(*load_arrays_from_file(file_path, clean, cache, calibration))
+
 
-    with open(file_path) as f:
-        for line in f.readlines():
-            timing, distance, signal_strength = line.split(" ")
-            timing = _format_timing(timing)
-            distance = float(distance)
-            signal_strength = int(signal_strength)
+@instrument.stage("loader.load_arrays_from_file", rows_out=instrument.columns_length)
+def load_arrays_from_file(
+    file_path: pathlib.Path, clean=True, cache=None, calibration=None
+) -> tuple[np.ndarray]:
+    """
+    Load a text or session file into NumPy arrays. If a cache is given, text
+    files are only parsed when they are not already in the cache.
 
-            if clean and distance == -1:
-                continue
+    Args:
+        file_path (pathlib.Path): Path to file.
+        clean (bool, optional): If true, remove points with invalid
+                                distance measurements. Defaults to True.
+        cache (ParseCache, optional): Cache of parsed files. Defaults to None.
+        calibration (Calibration, optional): Model used to correct the
+                                             distances, in a single
+                                             vectorized step. Defaults to
+                                             None.
 
-            data.append((timing, distance, signal_strength))
+    Returns:
+        tuple[np.ndarray]: Timings in milliseconds since midnight (-1 if
+                           unknown), distances, and signal strengths.
+    """
+    if file_path.suffix == session.SUFFIX:
+        timings, distances, strengths = open_session(file_path)[:]
+    elif cache is None:
+        timings, distances, strengths = parser.parse_file(file_path, clean=False)
+    else:
+        timings, distances, strengths = _parse_with_cache(file_path, cache)
 
-    return [list(i) for i in zip(*data)]
+    if clean:
+        valid = distances != -1
+        timings, distances, strengths = timings[valid], distances[valid], strengths[valid]
+    if calibration is not None:
+        distances = calibration.apply(distances)
+    return timings, distances, strengths
 
 
-def _format_timing(timing: str) -> datetime.datetime:
-    if timing == "-1":
-        return "-1"
-    dt = datetime.datetime.strptime(timing, "%H:%M:%S")
-    dt.replace(year=2023)
-    return dt
+def iter_data_from_folder(
+    folder_path: pathlib.Path,
+    chunk_size=CHUNK_SIZE,
+    clean=True,
+    high=None,
+    low=0,
+    calibration=None,
+) -> Iterator[tuple]:
+    """
+    Stream the data of each file in the folder as fixed-size chunks.
+
+    Args:
+        folder_path (pathlib.Path): Path to folder.
+        chunk_size (int, optional): Number of rows in each chunk. Defaults to
+                                    CHUNK_SIZE.
+        clean (bool, optional): If true, remove points with invalid
+                                distance measurements. Defaults to True.
+        high (int, optional): If given, distances outside of low and high
+                              are set to -1 as in cleaner.filter. Defaults to
+                              None.
+        low (int, optional): Lower bound used with high. Defaults to 0.
+        calibration (Calibration, optional): Model used to correct the
+                                             distances. Defaults to None.
+
+    Yields:
+        tuple: The path of the file and a chunk of its timings, distances
+               and signal strengths.
+    """
+    for file_path in sorted(folder_path.iterdir()):
+        for chunk in iter_data_from_file(file_path, chunk_size, clean, high, low, calibration):
+            yield file_path, chunk
+
+
+def iter_data_from_file(
+    file_path: pathlib.Path,
+    chunk_size=CHUNK_SIZE,
+    clean=True,
+    high=None,
+    low=0,
+    calibration=None,
+) -> Iterator[tuple[np.ndarray]]:
+    """
+    Stream a text or session file as chunks of arrays so that memory stays
+    flat no matter how long the ride is. Every chunk except the last holds
+    exactly chunk_size rows after cleaning.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+        chunk_size (int, optional): Number of rows in each chunk. Defaults to
+                                    CHUNK_SIZE.
+        clean (bool, optional): If true, remove points with invalid
+                                distance measurements. Defaults to True.
+        high (int, optional): If given, distances outside of low and high
+                              are set to -1 as in cleaner.filter. Defaults to
+                              None.
+        low (int, optional): Lower bound used with high. Defaults to 0.
+        calibration (Calibration, optional): Model used to correct the
+                                             distances before they are
+                                             filtered. Defaults to None.
+
+    Yields:
+        tuple[np.ndarray]: Timings in milliseconds since midnight (-1 if
+                           unknown), distances, and signal strengths.
+    """
+    pending = []
+    pending_rows = 0
+
+    for timings, distances, strengths in _iter_raw_chunks(file_path, chunk_size):
+        if clean:
+            valid = distances != -1
+            timings, distances, strengths = timings[valid], distances[valid], strengths[valid]
+        if calibration is not None:
+            distances = calibration.apply(distances)
+        if high is not None:
+            distances = cleaner.filter(distances, high, low)
+
+        pending.append((timings, distances, strengths))
+        pending_rows += len(distances)
+        if pending_rows < chunk_size:
+            continue
+
+        columns = [np.concatenate(column) for column in zip(*pending)]
+        full = pending_rows - pending_rows % chunk_size
+        for start in range(0, full, chunk_size):
+            yield tuple(column[start : start + chunk_size] for column in columns)
+        pending = [tuple(column[full:] for column in columns)]
+        pending_rows -= full
+
+    if pending_rows:
+        yield tuple(np.concatenate(column) for column in zip(*pending))
+
+
+def _iter_raw_chunks(
+    file_path: pathlib.Path, chunk_size: int
+) -> Iterator[tuple[np.ndarray]]:
+    """
+    Read a file chunk_size rows at a time without cleaning.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+        chunk_size (int): Number of rows to read at a time.
+
+    Yields:
+        tuple[np.ndarray]: Timings, distances, and signal strengths.
+    """
+    if file_path.suffix == session.SUFFIX:
+        data = open_session(file_path)
+        for start in range(0, len(data), chunk_size):
+            yield data[start : start + chunk_size]
+        return
+
+    with compression.open_file(file_path) as f:
+        while lines := list(itertools.islice(f, chunk_size)):
+            yield parser.parse_text("".join(lines), clean=False)
+
+
+def open_session(file_path: pathlib.Path) -> session.Session:
+    """
+    Open a binary session file written by the format stage. The columns are
+    memory-mapped, so only the rows that are used are ever read from disk.
+
+    Args:
+        file_path (pathlib.Path): Path to session file.
+
+    Returns:
+        session.Session: The memory-mapped session.
+    """
+    return session.Session(file_path)
+
+
+def _load_files(
+    file_paths: list[pathlib.Path], max_workers=None, cache=None
+) -> list[list[list]]:
+    """
+    Load several files, in parallel when there is more than one worker. The
+    workers return arrays, which are much cheaper to send between processes
+    than lists of datetimes, and are converted to lists here.
+
+    Args:
+        file_paths (list[pathlib.Path]): Paths to files.
+        max_workers (int, optional): Number of processes to use. Defaults to
+                                     the number of CPUs.
+        cache (ParseCache, optional): Cache of parsed files. Defaults to None.
+
+    Returns:
+        list[list[list]]: The data of each file, in the same order as
+                          file_paths.
+    """
+    if max_workers == 1 or len(file_paths) <= 1:
+        return [load_data_from_file(file_path, cache=cache) for file_path in file_paths]
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        arrays = executor.map(
+            load_arrays_from_file,
+            file_paths,
+            itertools.repeat(True),
+            itertools.repeat(cache),
+        )
+        return [parser.to_legacy(*data) for data in arrays]
+
+
+def _parse_with_cache(file_path: pathlib.Path, cache) -> tuple[np.ndarray]:
+    """
+    Parse a text file without cleaning, using the cached arrays if the file
+    has not changed since it was last parsed.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+        cache (ParseCache): Cache of parsed files.
+
+    Returns:
+        tuple[np.ndarray]: Timings, distances, and signal strengths.
+    """
+    data = cache.get(file_path)
+    if data is None:
+        data = parser.parse_file(file_path, clean=False)
+        cache.put(file_path, data)
+    return data
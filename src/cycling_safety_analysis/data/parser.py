@@ -0,0 +1,160 @@
+import datetime
+import pathlib
+
+import numpy as np
+
+from . import compression, instrument
+
+NULL_TIMING = -1
+LEGACY_DATE = np.datetime64("1900-01-01", "ms")
+MILLISECONDS_PER_DAY = 86_400_000
+
+_ZERO = ord("0")
+
+# Longest timing, HH:MM:SS.mmm. Timings are read one byte longer so that
+# any extra characters are seen rather than cut off.
+_TIMING_SIZE = 12
+
+
+@instrument.stage("parser.parse_file", rows_out=instrument.columns_length)
+def parse_file(file_path: pathlib.Path, clean=True) -> tuple[np.ndarray]:
+    """
+    Parse a file in the standard "HH:MM:SS[.mmm] distance strength" format in
+    one pass into NumPy arrays. The file may be compressed, see
+    compression.open_file.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+        clean (bool, optional): If true, remove points with invalid
+                                distance measurements. Defaults to True.
+
+    Returns:
+        tuple[np.ndarray]: Timings in milliseconds since midnight (-1 if
+                           unknown), distances, and signal strengths.
+    """
+    with compression.open_file(file_path) as f:
+        return parse_text(f.read(), clean)
+
+
+def parse_text(text: str, clean=True) -> tuple[np.ndarray]:
+    """
+    Parse text in the standard "HH:MM:SS[.mmm] distance strength" format.
+
+    Args:
+        text (str): Lines of data to parse.
+        clean (bool, optional): If true, remove points with invalid
+                                distance measurements. Defaults to True.
+
+    Returns:
+        tuple[np.ndarray]: Timings in milliseconds since midnight (-1 if
+                           unknown), distances, and signal strengths.
+    """
+    tokens = text.split()
+    if len(tokens) % 3 != 0:
+        raise ValueError("Expected three columns on every line.")
+
+    timings = parse_timings(tokens[0::3])
+    distances = np.array(tokens[1::3], dtype=np.float64)
+    strengths = np.array(tokens[2::3], dtype=np.int64)
+
+    if clean:
+        valid = distances != -1
+        timings, distances, strengths = timings[valid], distances[valid], strengths[valid]
+
+    return timings, distances, strengths
+
+
+def parse_timings(timings: list[str]) -> np.ndarray:
+    """
+    Convert timings in HH:MM:SS or HH:MM:SS.mmm to milliseconds since
+    midnight, working on the raw bytes of every timing at once instead of
+    calling strptime per line. They become epoch milliseconds only once the
+    ride's date is known, see at_date. Every timing
+    is checked in the same pass, and a malformed one raises a ValueError.
+
+    Args:
+        timings (list[str]): Timings in HH:MM:SS[.mmm], or "-1" if unknown.
+
+    Returns:
+        np.ndarray: Milliseconds since midnight of each timing, -1 if
+                    unknown.
+    """
+    if len(timings) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    try:
+        raw = np.array(timings, dtype=f"S{_TIMING_SIZE + 1}")
+    except UnicodeEncodeError:
+        bad = next(i for i, timing in enumerate(timings) if not timing.isascii())
+        raise ValueError(
+            f"Invalid timing {timings[bad]!r} at index {bad}, expected HH:MM:SS[.mmm]."
+        ) from None
+    characters = raw.view(np.uint8).reshape(len(raw), _TIMING_SIZE + 1)
+    digits = characters.astype(np.int64) - _ZERO
+    is_digit = (digits >= 0) & (digits <= 9)
+
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    seconds = digits[:, 6] * 10 + digits[:, 7]
+    # Missing fractional digits are NUL bytes, so only HH:MM:SS followed by
+    # nothing or by exactly three fractional digits is well formed.
+    has_fraction = characters[:, 8] == ord(".")
+    valid = (
+        is_digit[:, [0, 1, 3, 4, 6, 7]].all(axis=1)
+        & (characters[:, 2] == ord(":"))
+        & (characters[:, 5] == ord(":"))
+        & ((characters[:, 8] == 0) | (has_fraction & is_digit[:, 9:12].all(axis=1)))
+        & (characters[:, _TIMING_SIZE] == 0)
+        & (hours < 24)
+        & (minutes < 60)
+        & (seconds < 60)
+    )
+    unknown = raw == b"-1"
+    if not (valid | unknown).all():
+        bad = int(np.argmin(valid | unknown))
+        raise ValueError(f"Invalid timing {timings[bad]!r} at index {bad}, expected HH:MM:SS[.mmm].")
+
+    milliseconds = (hours * 60 + minutes) * 60_000 + seconds * 1000
+    fraction = digits[:, 9:12] @ np.array([100, 10, 1])
+    milliseconds += np.where(has_fraction, fraction, 0)
+    milliseconds[unknown] = NULL_TIMING
+    return milliseconds
+
+
+def at_date(timings: np.ndarray, date: datetime.date) -> np.ndarray:
+    """
+    Convert milliseconds since midnight to epoch milliseconds on a date.
+
+    Args:
+        timings (np.ndarray): Milliseconds since midnight, -1 if unknown.
+        date (datetime.date): Date the data was recorded.
+
+    Returns:
+        np.ndarray: Epoch milliseconds of each timing, -1 if unknown.
+    """
+    offset = np.datetime64(date, "ms").astype(np.int64)
+    timings = np.asarray(timings)
+    return np.where(timings == NULL_TIMING, NULL_TIMING, timings + offset)
+
+
+def to_legacy(
+    timings: np.ndarray, distances: np.ndarray, strengths: np.ndarray
+) -> list[list]:
+    """
+    Convert parsed arrays to the lists returned by the original loader, where
+    timings are datetime objects on 1900-01-01 and unknown timings are "-1".
+
+    Args:
+        timings (np.ndarray): Milliseconds since midnight, -1 if unknown.
+        distances (np.ndarray): Distances.
+        strengths (np.ndarray): Signal strengths.
+
+    Returns:
+        list[list]: Returns three lists: timings, distances, and signal
+                    strengths respectively.
+    """
+    timings = np.asarray(timings)
+    milliseconds = timings % MILLISECONDS_PER_DAY
+    datetimes = (LEGACY_DATE + milliseconds.astype("timedelta64[ms]")).astype(object)
+    datetimes[timings == NULL_TIMING] = "-1"
+    return [datetimes.tolist(), np.asarray(distances).tolist(), np.asarray(strengths).tolist()]
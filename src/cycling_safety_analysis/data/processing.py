@@ -2,17 +2,23 @@ import datetime
 
 import numpy as np
 
+from . import ragged
+
 
 def get_mean(data: list) -> list[float]:
     """
     Get the mean of a list of data rounded to 2 decimal places.
 
     Args:
-        data (list[list[float]]): A list containing a list of measured points for each interval.
+        data (list[list[float]]): A list containing a list of measured points for each interval,
+                                  or a Ragged array of them.
 
     Returns:
-        list[float]: Return an array containing the mean of the points at each interval.
+        list[float]: Return an array containing the mean of the points at each interval,
+                     as an np.ndarray if data is a Ragged array.
     """
+    if isinstance(data, ragged.Ragged):
+        return np.round(data.mean(), 2)
     return [round(np.mean(i), 2) for i in data]
 
 
@@ -21,11 +27,15 @@ def get_std(data: list) -> list[float]:
     Get the standard deviation of a list of data rounded to 2 decimal places.
 
     Args:
-        data (list[list[float]]): A list containing a list of measured points for each interval.
+        data (list[list[float]]): A list containing a list of measured points for each interval,
+                                  or a Ragged array of them.
 
     Returns:
-        list[float]: Return an array containing the standard deviation of the points at each interval.
+        list[float]: Return an array containing the standard deviation of the points at each interval,
+                     as an np.ndarray if data is a Ragged array.
     """
+    if isinstance(data, ragged.Ragged):
+        return np.round(data.std(), 2)
     return [round(np.std(i), 2) for i in data]
 
 
@@ -40,3 +50,22 @@ def datetime_to_timestamps(data: list[datetime.datetime]) -> list[int]:
         list[int]: List of integers representing datetime objects.
     """
     return [int(dt.timestamp()) for dt in data]
+
+
+def to_milliseconds(data) -> np.ndarray:
+    """
+    Convert timings to an integer millisecond timeline. Integer arrays, such
+    as the milliseconds since midnight of a loaded ride, are returned
+    unchanged and lists of datetime objects are converted to epoch
+    milliseconds in a single vectorized step.
+
+    Args:
+        data: Integer milliseconds or a list of datetime objects.
+
+    Returns:
+        np.ndarray: Milliseconds of each timing.
+    """
+    data = np.asarray(data)
+    if np.issubdtype(data.dtype, np.integer):
+        return data.astype(np.int64, copy=False)
+    return data.astype("datetime64[ms]").astype(np.int64)
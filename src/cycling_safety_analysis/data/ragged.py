@@ -0,0 +1,160 @@
+from collections.abc import Iterator
+
+import numpy as np
+
+
+class Ragged:
+    def __init__(self, values: np.ndarray, offsets: np.ndarray) -> None:
+        """
+        A list of variable length lists stored as one flat array of values
+        and the offset of each list into it, such as the measurements taken
+        at each distance interval of a basic test. Statistics of every list
+        are computed in a single pass over the flat array.
+
+        Args:
+            values (np.ndarray): Values of every list, one after another.
+            offsets (np.ndarray): Start of each list in values, followed by
+                                  the end of the last list.
+        """
+        self.values = np.asarray(values, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+        if len(self.offsets) == 0 or self.offsets[0] != 0 or self.offsets[-1] != len(self.values):
+            raise ValueError("Offsets must run from 0 to the number of values.")
+        if np.any(np.diff(self.offsets) < 0):
+            raise ValueError("Offsets must not decrease.")
+
+    @classmethod
+    def from_lists(cls, data: list[list]) -> "Ragged":
+        """
+        Build a ragged array from a list of lists or arrays.
+
+        Args:
+            data (list[list]): data[i] is the ith list.
+
+        Returns:
+            Ragged: The lists as a ragged array.
+        """
+        if isinstance(data, Ragged):
+            return data
+        lengths = [len(values) for values in data]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.intp)))
+        values = np.concatenate(data) if lengths else np.empty(0)
+        return cls(values, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """
+        Get a view of a single list.
+
+        Args:
+            index (int): Index of the list.
+
+        Returns:
+            np.ndarray: Values of the list.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Ragged index out of range.")
+        return self.values[self.offsets[index] : self.offsets[index + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def lengths(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def segment_ids(self) -> np.ndarray:
+        """
+        Get the index of the list each value belongs to.
+
+        Returns:
+            np.ndarray: ids[j] is the list of values[j].
+        """
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def tolist(self) -> list[list]:
+        return [values.tolist() for values in self]
+
+    def sum(self) -> np.ndarray:
+        """
+        Sum every list at once. Empty lists sum to 0.
+
+        Returns:
+            np.ndarray: The sum of each list.
+        """
+        return _segment_sum(self.values, self.offsets)
+
+    def mean(self) -> np.ndarray:
+        """
+        Get the mean of every list at once. Empty lists have a mean of NaN.
+
+        Returns:
+            np.ndarray: The mean of each list.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum() / self.lengths
+
+    def std(self) -> np.ndarray:
+        """
+        Get the population standard deviation of every list at once, as
+        np.std does for a single list. Empty lists have a std of NaN.
+
+        Returns:
+            np.ndarray: The standard deviation of each list.
+        """
+        deviations = self.values - np.repeat(self.mean(), self.lengths)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(_segment_sum(deviations**2, self.offsets) / self.lengths)
+
+    def mask(self, keep: np.ndarray) -> "Ragged":
+        """
+        Keep the values where keep is true, in their lists.
+
+        Args:
+            keep (np.ndarray): Whether to keep each value.
+
+        Returns:
+            Ragged: The kept values, with the same number of lists.
+        """
+        kept = np.bincount(self.segment_ids()[keep], minlength=len(self))
+        return Ragged(self.values[keep], np.concatenate(([0], np.cumsum(kept))))
+
+    def clean_std(self) -> "Ragged":
+        """
+        Remove the values of every list which are more than one standard
+        deviation from the mean of their list, rounding those which are kept
+        to 2 decimal places, as cleaner.clean_std does for a single list.
+
+        Returns:
+            Ragged: The cleaned lists.
+        """
+        mean = np.repeat(self.mean(), self.lengths)
+        std = np.repeat(self.std(), self.lengths)
+        cleaned = self.mask(np.abs(self.values - mean) <= std)
+        cleaned.values = np.round(cleaned.values, 2)
+        return cleaned
+
+
+def _segment_sum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """
+    Sum each segment of values with a single reduceat. reduceat gives the
+    value at the start of an empty segment rather than 0, so only the starts
+    of non-empty segments are reduced.
+
+    Args:
+        values (np.ndarray): Flat values.
+        offsets (np.ndarray): Segment offsets, as in Ragged.
+
+    Returns:
+        np.ndarray: The sum of each segment.
+    """
+    sums = np.zeros(len(offsets) - 1)
+    non_empty = offsets[1:] > offsets[:-1]
+    if np.any(non_empty):
+        sums[non_empty] = np.add.reduceat(values, offsets[:-1][non_empty])
+    return sums
@@ -0,0 +1,190 @@
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+
+SUFFIX = ".session"
+MAGIC = b"CSAS"
+VERSION = 2
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S4"),
+        ("version", "<u2"),
+        ("reserved", "<u2"),
+        ("rows", "<u8"),
+        ("padding", "V16"),
+    ]
+)
+TIME_DTYPE = np.dtype("<i8")
+DISTANCE_DTYPE = np.dtype("<f8")
+STRENGTH_DTYPE = np.dtype("<i8")
+COLUMNS = (TIME_DTYPE, DISTANCE_DTYPE, STRENGTH_DTYPE)
+
+
+class Session:
+    def __init__(self, file_path: pathlib.Path) -> None:
+        """
+        Open a binary session file without reading its columns into memory.
+
+        The file is a 32 byte header followed by three fixed-width columns:
+        timings (milliseconds since midnight, -1 if unknown), distances and
+        signal strengths. Each column is memory-mapped, so opening a session
+        is near-instant and slicing it returns views rather than copies.
+
+        Args:
+            file_path (pathlib.Path): Path to the session file.
+        """
+        self.file_path = file_path
+        header = np.fromfile(file_path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{file_path} is not a session file.")
+        if header["version"][0] != VERSION:
+            raise ValueError(
+                f"{file_path} has unsupported session version {header['version'][0]}."
+            )
+
+        rows = int(header["rows"][0])
+        columns = []
+        offset = HEADER_DTYPE.itemsize
+        for dtype in COLUMNS:
+            columns.append(_map_column(file_path, dtype, offset, rows))
+            offset += dtype.itemsize * rows
+        self.timings, self.distances, self.signal_strengths = columns
+
+    def __len__(self) -> int:
+        return len(self.distances)
+
+    def __getitem__(self, key) -> tuple[np.ndarray]:
+        """
+        Slice every column of the session at once.
+
+        Args:
+            key: Index or slice into the rows of the session.
+
+        Returns:
+            tuple[np.ndarray]: Timings, distances and signal strengths.
+        """
+        return self.timings[key], self.distances[key], self.signal_strengths[key]
+
+
+def write_session(
+    file_path: pathlib.Path,
+    timings: np.ndarray,
+    distances: np.ndarray,
+    strengths: np.ndarray,
+) -> None:
+    """
+    Write three equal-length columns to a binary session file.
+
+    Args:
+        file_path (pathlib.Path): Path to the session file.
+        timings (np.ndarray): Milliseconds since midnight of each point, -1
+                              if the time is unknown.
+        distances (np.ndarray): Distance of each point.
+        strengths (np.ndarray): Signal strength of each point.
+    """
+    columns = [
+        np.ascontiguousarray(column, dtype=dtype)
+        for column, dtype in zip((timings, distances, strengths), COLUMNS)
+    ]
+    rows = len(columns[0])
+    if any(len(column) != rows for column in columns):
+        raise ValueError("Session columns must all have the same length.")
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["rows"] = rows
+
+    with open(file_path, "wb") as f:
+        header.tofile(f)
+        for column in columns:
+            column.tofile(f)
+
+
+class SessionWriter:
+    def __init__(self, file_path: pathlib.Path) -> None:
+        """
+        Write a session file block by block, for data which does not fit in
+        memory at once. Timings are written straight after the header while
+        the other columns are spooled to temporary files, and are appended
+        when the writer is closed.
+
+        Args:
+            file_path (pathlib.Path): Path to the session file.
+        """
+        self.file_path = file_path
+        self.rows = 0
+        self._file = open(file_path, "wb")
+        self._file.write(bytes(HEADER_DTYPE.itemsize))
+        self._spools = [tempfile.TemporaryFile() for _ in COLUMNS[1:]]
+
+    def __enter__(self) -> "SessionWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def append(self, timings: np.ndarray, distances: np.ndarray, strengths: np.ndarray) -> None:
+        """
+        Append rows to the session.
+
+        Args:
+            timings (np.ndarray): Milliseconds since midnight of each point,
+                                  -1 if the time is unknown.
+            distances (np.ndarray): Distance of each point.
+            strengths (np.ndarray): Signal strength of each point.
+        """
+        columns = [
+            np.ascontiguousarray(column, dtype=dtype)
+            for column, dtype in zip((timings, distances, strengths), COLUMNS)
+        ]
+        rows = len(columns[0])
+        if any(len(column) != rows for column in columns):
+            raise ValueError("Session columns must all have the same length.")
+
+        columns[0].tofile(self._file)
+        for spool, column in zip(self._spools, columns[1:]):
+            column.tofile(spool)
+        self.rows += rows
+
+    def close(self) -> None:
+        """
+        Append the spooled columns and write the header.
+        """
+        if self._file.closed:
+            return
+        for spool in self._spools:
+            spool.seek(0)
+            shutil.copyfileobj(spool, self._file)
+            spool.close()
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["rows"] = self.rows
+        self._file.seek(0)
+        header.tofile(self._file)
+        self._file.close()
+
+
+def _map_column(
+    file_path: pathlib.Path, dtype: np.dtype, offset: int, rows: int
+) -> np.ndarray:
+    """
+    Memory-map a single column of a session file.
+
+    Args:
+        file_path (pathlib.Path): Path to the session file.
+        dtype (np.dtype): Type of the column.
+        offset (int): Byte offset of the column from the start of the file.
+        rows (int): Number of rows in the column.
+
+    Returns:
+        np.ndarray: Read-only view of the column.
+    """
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file_path, dtype=dtype, mode="r", offset=offset, shape=(rows,))
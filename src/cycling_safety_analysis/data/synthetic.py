@@ -0,0 +1,289 @@
+import pathlib
+from collections.abc import Iterator
+
+import numpy as np
+
+from . import parser, session
+
+# Number of points generated at a time.
+BLOCK_SIZE = 1 << 20
+
+# Readings are drawn in chunks of this size, each with its own random
+# numbers, so that a seed gives the same ride whatever the block size.
+_CHUNK_SIZE = 1 << 16
+
+# What each sensor records on a ride, in mm. Between passes the lidar and
+# laser see the far side of the road, or nothing, while the TOF sensor sees
+# nothing at all. Strengths are -1 for sensors which do not report them.
+PROFILES = {
+    "lidar": {
+        "sample_rate": 10,
+        "timing_resolution": 1000,
+        "background": (4000, 12000),
+        "dropout_rate": 0.1,
+        "max_range": 12000,
+        "strength": None,
+    },
+    "laser": {
+        "sample_rate": 50,
+        "timing_resolution": 1,
+        "background": (5000, 40000),
+        "dropout_rate": 0.05,
+        "max_range": 40000,
+        "strength": None,
+    },
+    "tof": {
+        "sample_rate": 10,
+        "timing_resolution": 1000,
+        "background": None,
+        "dropout_rate": 0.2,
+        "max_range": 4000,
+        "strength": (1, 5),
+    },
+}
+
+# Distance in mm and duration in ms of the passes.
+PASS_DISTANCE = (1800, 500)
+PASS_DURATION = (300, 2000)
+
+_MIN_PASS_DISTANCE = 200
+
+
+class RideGenerator:
+    def __init__(
+        self,
+        sensor="lidar",
+        sample_rate=None,
+        pass_rate=2.0,
+        noise=50.0,
+        spurious_rate=0.01,
+        start=8 * 3_600_000,
+        seed=None,
+    ) -> None:
+        """
+        Generate rides which look like those recorded by a sensor: vehicles
+        pass at random times and distances, readings are noisy, some are
+        missing and some are spurious. Rides of any length are generated a
+        block at a time, so even 10^8 points never have to be held in memory.
+
+        Args:
+            sensor (str, optional): "lidar", "laser" or "tof", see PROFILES.
+                                    Defaults to "lidar".
+            sample_rate (float, optional): Readings per second. Defaults to
+                                           the rate of the sensor.
+            pass_rate (float, optional): Average number of passes per minute.
+                                         Defaults to 2.0.
+            noise (float, optional): Standard deviation in mm of the readings
+                                     of a pass. Defaults to 50.0.
+            spurious_rate (float, optional): Share of readings which are at
+                                             a random distance. Defaults to
+                                             0.01.
+            start (int, optional): Time of the first reading in milliseconds
+                                   since midnight. Defaults to 8 am.
+            seed (int, optional): Seed of the random numbers. Defaults to
+                                  None.
+        """
+        if sensor not in PROFILES:
+            raise ValueError(f"Unknown sensor {sensor!r}.")
+        self.sensor = sensor
+        self.profile = PROFILES[sensor]
+        self.sample_rate = sample_rate or self.profile["sample_rate"]
+        self.pass_rate = pass_rate
+        self.noise = noise
+        self.spurious_rate = spurious_rate
+        self.start = start
+        self.seed = seed
+
+    def generate(self, points: int) -> tuple[np.ndarray]:
+        """
+        Generate a whole ride in memory.
+
+        Args:
+            points (int): Number of readings.
+
+        Returns:
+            tuple[np.ndarray]: Timings in milliseconds since midnight,
+                               distances in mm, and signal strengths.
+        """
+        blocks = list(self.iter_blocks(points))
+        if not blocks:
+            return (np.empty(0, np.int64), np.empty(0), np.empty(0, np.int64))
+        return tuple(np.concatenate(column) for column in zip(*blocks))
+
+    def iter_blocks(self, points: int, block_size=BLOCK_SIZE) -> Iterator[tuple[np.ndarray]]:
+        """
+        Generate a ride block_size readings at a time.
+
+        Args:
+            points (int): Number of readings.
+            block_size (int, optional): Number of readings in each block.
+                                        Defaults to BLOCK_SIZE.
+
+        Yields:
+            tuple[np.ndarray]: Timings, distances and signal strengths.
+        """
+        entropy = np.random.SeedSequence(self.seed).entropy
+        duration = points * 1000 / self.sample_rate
+        passes = self._passes(np.random.default_rng(entropy), duration)
+
+        for first in range(0, points, block_size):
+            last = min(first + block_size, points)
+            chunks = range(first // _CHUNK_SIZE, (last - 1) // _CHUNK_SIZE + 1)
+            readings = [self._chunk(entropy, chunk, points, passes) for chunk in chunks]
+            offset = first - chunks[0] * _CHUNK_SIZE
+            yield tuple(
+                np.concatenate(column)[offset : offset + last - first] for column in zip(*readings)
+            )
+
+    def write(self, file_path: pathlib.Path, points: int, block_size=BLOCK_SIZE) -> pathlib.Path:
+        """
+        Write a ride to a session file, or to a text file in the standard
+        format if file_path does not end in session.SUFFIX.
+
+        Args:
+            file_path (pathlib.Path): Path to the new file.
+            points (int): Number of readings.
+            block_size (int, optional): Number of readings generated at a
+                                        time. Defaults to BLOCK_SIZE.
+
+        Returns:
+            pathlib.Path: Path to the new file.
+        """
+        blocks = self.iter_blocks(points, block_size)
+        if file_path.suffix == session.SUFFIX:
+            with session.SessionWriter(file_path) as writer:
+                for block in blocks:
+                    writer.append(*block)
+            return file_path
+
+        with open(file_path, "w") as f:
+            for timings, distances, strengths in blocks:
+                timings = format_timings(timings, self.profile["timing_resolution"] < 1000)
+                f.write(
+                    "".join(
+                        f"{t} {d:g} {s}\n"
+                        for t, d, s in zip(timings, distances.tolist(), strengths.tolist())
+                    )
+                )
+        return file_path
+
+    def _chunk(self, entropy: int, chunk: int, points: int, passes: tuple) -> tuple[np.ndarray]:
+        """
+        Generate the readings of a chunk of the ride from its own random
+        numbers.
+
+        Args:
+            entropy (int): Entropy of the ride's random numbers.
+            chunk (int): Index of the chunk.
+            points (int): Number of readings in the ride.
+            passes (tuple): Passes of the ride, as from _passes.
+
+        Returns:
+            tuple[np.ndarray]: Timings, distances and signal strengths.
+        """
+        rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(chunk,)))
+        indices = np.arange(chunk * _CHUNK_SIZE, min((chunk + 1) * _CHUNK_SIZE, points))
+        return self._readings(rng, indices, *passes)
+
+    def _passes(self, rng: np.random.Generator, duration: float) -> tuple[np.ndarray]:
+        """
+        Schedule the passes of a ride as a Poisson process.
+
+        Args:
+            rng (np.random.Generator): Random numbers.
+            duration (float): Length of the ride in milliseconds.
+
+        Returns:
+            tuple[np.ndarray]: Start and end of each pass in milliseconds
+                               from the start of the ride, and its distance.
+        """
+        expected = duration / 60_000 * self.pass_rate
+        count = rng.poisson(expected) if expected > 0 else 0
+        starts = np.sort(rng.uniform(0, duration, count))
+        ends = starts + rng.uniform(*PASS_DURATION, count)
+        # Passes cannot overlap, so each one ends before the next starts.
+        ends[:-1] = np.minimum(ends[:-1], starts[1:])
+        distances = np.maximum(rng.normal(*PASS_DISTANCE, count), _MIN_PASS_DISTANCE)
+        return starts, ends, distances
+
+    def _readings(
+        self,
+        rng: np.random.Generator,
+        indices: np.ndarray,
+        starts: np.ndarray,
+        ends: np.ndarray,
+        distances: np.ndarray,
+    ) -> tuple[np.ndarray]:
+        """
+        Generate the readings of a block of the ride.
+
+        Args:
+            rng (np.random.Generator): Random numbers.
+            indices (np.ndarray): Index of each reading in the ride.
+            starts (np.ndarray): Start of each pass, as from _passes.
+            ends (np.ndarray): End of each pass.
+            distances (np.ndarray): Distance of each pass.
+
+        Returns:
+            tuple[np.ndarray]: Timings, distances and signal strengths.
+        """
+        size = len(indices)
+        offsets = indices * 1000 / self.sample_rate
+
+        # Find the pass, if any, that each reading is taken during.
+        passes = np.searchsorted(starts, offsets, side="right") - 1
+        in_pass = passes >= 0
+        in_pass[in_pass] = offsets[in_pass] < ends[passes[in_pass]]
+
+        background = self.profile["background"]
+        if background is None:
+            readings = np.full(size, -1.0)
+        else:
+            readings = rng.uniform(*background, size)
+        readings[in_pass] = distances[passes[in_pass]] + rng.normal(0, self.noise, in_pass.sum())
+
+        spurious = rng.random(size) < self.spurious_rate
+        readings[spurious] = rng.uniform(0, self.profile["max_range"], spurious.sum())
+        dropped = rng.random(size) < self.profile["dropout_rate"]
+        readings = np.where(dropped & ~in_pass, -1, np.round(np.maximum(readings, 0)))
+        readings[readings == 0] = -1
+
+        strength = self.profile["strength"]
+        if strength is None:
+            strengths = np.full(size, -1, dtype=np.int64)
+        else:
+            strengths = np.where(readings == -1, 0, rng.integers(*strength, size))
+
+        resolution = self.profile["timing_resolution"]
+        timings = (self.start + offsets).astype(np.int64) // resolution * resolution
+        return timings, readings, strengths
+
+
+def format_timings(timings: np.ndarray, milliseconds=False) -> list[str]:
+    """
+    Format timings as in the standard format, the inverse of
+    parser.parse_timings.
+
+    Args:
+        timings (np.ndarray): Milliseconds since midnight, -1 if unknown.
+        milliseconds (bool, optional): If true, write HH:MM:SS.mmm rather
+                                       than HH:MM:SS. Defaults to False.
+
+    Returns:
+        list[str]: The formatted timings.
+    """
+    timings = np.asarray(timings, dtype=np.int64)
+    known = timings % parser.MILLISECONDS_PER_DAY
+    seconds, millisecond = np.divmod(known, 1000)
+    minutes, second = np.divmod(seconds, 60)
+    hour, minute = np.divmod(minutes, 60)
+    if milliseconds:
+        text = [
+            f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
+            for h, m, s, ms in zip(hour.tolist(), minute.tolist(), second.tolist(), millisecond.tolist())
+        ]
+    else:
+        text = [f"{h:02d}:{m:02d}:{s:02d}" for h, m, s in zip(hour.tolist(), minute.tolist(), second.tolist())]
+    for index in np.flatnonzero(timings == parser.NULL_TIMING).tolist():
+        text[index] = str(parser.NULL_TIMING)
+    return text
@@ -1,132 +1,269 @@
+import itertools
 import pathlib
+import warnings
+from collections.abc import Iterator
 
+import numpy as np
+
+from ..data import compression as compressed
+from ..data import instrument
 from . import utils
 
+# Every frame is 13 bytes: AA 00 00 22 00 03 00 d1 d2 d3 xx xx cs, where
+# d1..d3 in bytes 7 to 9 is the distance in mm and cs is the sum of the bytes
+# between the header and the checksum.
+FRAME_SIZE = 13
+HEADER = 0xAA
+
+# Length of a frame written as space separated hex bytes.
+_FRAME_TEXT_SIZE = FRAME_SIZE * 3 - 1
+
+# Value of each ASCII hex digit, -1 for any other character.
+_HEX_VALUES = np.full(256, -1, dtype=np.int16)
+_HEX_VALUES[np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)] = np.arange(16)
+_HEX_VALUES[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
 
-def format_protocol_data(source_folder: pathlib.Path, destination_folder: pathlib.Path) -> None:
+
+def format_protocol_data(
+    source_folder: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> None:
     """
     Format hex data collected by the laser's software.
 
     Args:
         source_folder (pathlib.Path): Raw data's folder path.
         destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write binary session files instead
+                                 of text files. Defaults to False.
+        compression (str, optional): Compress the text files with this
+                                     suffix, such as ".gz". Defaults to None.
     """
     for file_path in source_folder.iterdir():
-        file_name = utils.get_file_name(file_path)
-        data = _get_protocol_data(file_path)
-        utils.write_data_to_file(destination_folder, file_name, data)
+        format_protocol_file(file_path, destination_folder, binary, compression=compression)
 
 
-def format_ascii_data(source_folder: pathlib.Path, destination_folder: pathlib.Path) -> None:
+def format_ascii_data(
+    source_folder: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> None:
     """
     Format ASCII data collected by the laser's software.
 
     Args:
         source_folder (pathlib.Path): Raw data's folder path.
         destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write binary session files instead
+                                 of text files. Defaults to False.
+        compression (str, optional): Compress the text files with this
+                                     suffix, such as ".gz". Defaults to None.
     """
     for file_path in source_folder.iterdir():
-        file_name = utils.get_file_name(file_path)
-        data = _get_ascii_data(file_path)
-        utils.write_data_to_file(destination_folder, file_name, data)
+        format_ascii_file(file_path, destination_folder, binary, compression=compression)
 
 
-def _get_protocol_data(file_path: pathlib.Path) -> list[float]:
+@instrument.stage("jrt_bb2x.format_protocol_file")
+def format_protocol_file(
+    file_path: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> pathlib.Path:
     """
-    Helper function that formats a file of laser hex data collected by
-    the software.
+    Format a single file of hex data collected by the laser's software.
 
     Args:
         file_path (pathlib.Path): Path to raw data file.
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+        compression (str, optional): Compress the text file with this
+                                     suffix, such as ".gz". Defaults to None.
 
     Returns:
-        list[float]: List of distance data.
+        pathlib.Path: Path to the formatted data file.
     """
-    data = []
-    with open(file_path) as f:
-        for line in f.readlines():
-            line = line.strip()
-            if line:
-                protocol = _extract_protocol(line)
-                distance = _extract_distance_from_protocol(protocol)
-                data.append((-1, distance, -1))
-    return data
+    data = _iter_protocol_blocks(file_path)
+    return utils.write_blocks(destination_folder, utils.get_file_name(file_path), data, binary, compression)
 
 
-def _get_ascii_data(file_path: pathlib.Path) -> list[float]:
+@instrument.stage("jrt_bb2x.format_ascii_file")
+def format_ascii_file(
+    file_path: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> pathlib.Path:
     """
-    Helper function that formats a file of laser ASCII data collected
-    by the software.
+    Format a single file of ASCII data collected by the laser's software.
 
     Args:
         file_path (pathlib.Path): Path to raw data file.
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+        compression (str, optional): Compress the text file with this
+                                     suffix, such as ".gz". Defaults to None.
 
     Returns:
-        list[float]: List of distance data.
+        pathlib.Path: Path to the formatted data file.
     """
-    data = []
-    with open(file_path) as f:
-        for line in f.readlines():
-            line = line.strip()
-            if _is_valid_line(line):
-                timing = _extract_time(line)
-                distance = _extract_ascii(line)
-                data.append((timing, float(distance), -1))
-    return data
+    data = _iter_ascii_blocks(file_path)
+    return utils.write_blocks(destination_folder, utils.get_file_name(file_path), data, binary, compression)
 
 
-def _is_valid_line(line: str) -> bool:
+def decode_frames(frames: np.ndarray) -> tuple[np.ndarray]:
     """
-    Return if the line is in a valid format. Currently the test is a little
-    simplistic. I will improve on it if needed.
+    Decode a matrix of protocol frames and validate their checksums.
 
     Args:
-        line (str): The line of data recorded by the laser software.
+        frames (np.ndarray): uint8 matrix with a frame of FRAME_SIZE bytes on
+                             each row.
 
     Returns:
-        bool: True if the line is in a standard format containing useful data.
+        tuple[np.ndarray]: The distance of each frame in mm, and whether each
+                           frame has a valid header and checksum.
     """
-    return "]" in line
+    frames = np.asarray(frames, dtype=np.uint8).reshape(-1, FRAME_SIZE)
+    checksums = frames[:, 1:12].sum(axis=1) & 0xFF
+    valid = (frames[:, 0] == HEADER) & (checksums == frames[:, 12])
+    distances = (
+        frames[:, 7].astype(np.int64) << 16
+        | frames[:, 8].astype(np.int64) << 8
+        | frames[:, 9]
+    )
+    return distances, valid
+
+
+def encode_frames(distances: np.ndarray) -> np.ndarray:
+    """
+    Encode distances as protocol frames with valid checksums, the inverse of
+    decode_frames.
 
+    Args:
+        distances (np.ndarray): Distance of each frame in mm.
 
-def _extract_time(line: str) -> str:
+    Returns:
+        np.ndarray: uint8 matrix with a frame of FRAME_SIZE bytes on each row.
     """
-    Extract the time from a line of raw data.
+    distances = np.asarray(distances, dtype=np.int64)
+    frames = np.zeros((len(distances), FRAME_SIZE), dtype=np.uint8)
+    frames[:, :6] = [HEADER, 0x00, 0x00, 0x22, 0x00, 0x03]
+    frames[:, 7] = distances >> 16 & 0xFF
+    frames[:, 8] = distances >> 8 & 0xFF
+    frames[:, 9] = distances & 0xFF
+    frames[:, 12] = frames[:, 1:12].sum(axis=1) & 0xFF
+    return frames
+
+
+def _iter_protocol_blocks(
+    file_path: pathlib.Path, block_size=utils.BLOCK_SIZE
+) -> Iterator[list[tuple]]:
+    """
+    Helper function that formats a file of laser hex data collected by
+    the software, block_size lines at a time. Frames which are corrupt,
+    including lines with no "]" before the payload, have a distance of -1.
 
     Args:
-        line (str): Line of raw data from the laser software.
+        file_path (pathlib.Path): Path to raw data file.
+        block_size (int, optional): Number of lines in each block. Defaults to
+                                    utils.BLOCK_SIZE.
+
+    Yields:
+        list[tuple]: Block of formatted distance data.
+    """
+    frame_count = corrupt_count = 0
+    with compressed.open_file(file_path) as f:
+        while lines := list(itertools.islice(f, block_size)):
+            # A line with no "]" has an empty payload, which is not well formed.
+            payloads = [line.strip().partition("]")[2] for line in lines if line.strip()]
+            frames, well_formed = _hex_to_frames(payloads)
+            distances, valid = decode_frames(frames)
+            valid &= well_formed
+            frame_count += len(valid)
+            corrupt_count += np.count_nonzero(~valid)
+
+            distances = np.where(valid, distances, -1).tolist()
+            yield [(-1, round(d / 1000, 2) if d != -1 else -1, -1) for d in distances]
+
+    instrument.count("jrt_bb2x.corrupt_frames", int(corrupt_count))
+    if corrupt_count:
+        warnings.warn(f"{corrupt_count} of {frame_count} frames in {file_path} are corrupt.")
+
+
+def _iter_ascii_blocks(
+    file_path: pathlib.Path, block_size=utils.BLOCK_SIZE
+) -> Iterator[list[tuple]]:
+    """
+    Helper function that formats a file of laser ASCII data collected
+    by the software, block_size lines at a time.
+
+    Args:
+        file_path (pathlib.Path): Path to raw data file.
+        block_size (int, optional): Number of lines in each block. Defaults to
+                                    utils.BLOCK_SIZE.
+
+    Yields:
+        list[tuple]: Block of formatted distance data.
+    """
+    with compressed.open_file(file_path) as f:
+        while lines := list(itertools.islice(f, block_size)):
+            block = []
+            for line in lines:
+                line = line.strip()
+                if _is_valid_line(line):
+                    timing = _extract_time(line)
+                    distance = _extract_ascii(line)
+                    block.append((timing, float(distance), -1))
+            yield block
+
+
+def _is_valid_line(line: str) -> bool:
+    """
+    Return if the line is in a valid format. Currently the test is a little
+    simplistic. I will improve on it if needed.
+
+    Args:
+        line (str): The line of data recorded by the laser software.
 
     Returns:
-        str: The time in HH:MM:SS.
+        bool: True if the line is in a standard format containing useful data.
     """
-    return line.split(" ")[1].split(".")[0]
+    return "]" in line
 
 
-def _extract_protocol(line: str) -> list[str]:
+def _extract_time(line: str) -> str:
     """
-    Extract the protocol from a line of raw data.
+    Extract the time from a line of raw data.
 
     Args:
         line (str): Line of raw data from the laser software.
 
     Returns:
-        list[str]: Protocol in [byte1, byte2, etc...].
+        str: The time in HH:MM:SS.mmm.
     """
-    return line.split("]")[1].split(" ")
+    return line.split(" ")[1]
 
 
-def _extract_distance_from_protocol(protocol: list[str]) -> str:
+def _hex_to_frames(payloads: list[str]) -> tuple[np.ndarray]:
     """
-    Given a protocol of bytes, extract the distance from it.
+    Convert the hex payload of each line into a matrix of frames in one go.
+    Only the first frame of each line is used, as the software sometimes
+    writes the same frame twice. Payloads with characters which are not
+    ASCII, such as from a corrupt line, are not well formed.
 
     Args:
-        protocol (list[str]): Protocol in [byte1, byte2, etc...].
+        payloads (list[str]): Frames as space separated hex bytes.
 
     Returns:
-        str: The distance in m.
+        tuple[np.ndarray]: uint8 matrix with a frame on each row, and whether
+                           each payload held a whole frame of hex bytes.
     """
-    distance_data = "".join(protocol[7:10])
-    return round(int(distance_data, base=16) / 1000, 2)
+    is_ascii = np.array([payload.isascii() for payload in payloads], dtype=bool)
+    encoded = [payload.encode("ascii", errors="replace") for payload in payloads]
+    text = np.array(encoded, dtype=f"S{_FRAME_TEXT_SIZE}")
+    characters = text.view(np.uint8).reshape(len(text), _FRAME_TEXT_SIZE)
+    high = _HEX_VALUES[characters[:, 0::3]]
+    low = _HEX_VALUES[characters[:, 1::3]]
+    well_formed = (
+        is_ascii
+        & ((high >= 0) & (low >= 0)).all(axis=1)
+        & (characters[:, 2::3] == ord(" ")).all(axis=1)
+    )
+    frames = (high << 4 | low).astype(np.uint8)
+    return frames, well_formed
 
 
 def _extract_ascii(line: str) -> int:
@@ -139,11 +276,11 @@ def _extract_ascii(line: str) -> int:
     Returns:
         str: Distance in m.
     """
-    distance = line.split("]")[1]
+    distance = line.partition("]")[2]
     if _is_valid_distance(distance):
         return int(distance)
     return -1
 
 
 def _is_valid_distance(distance: str) -> bool:
-    return all(character.isdigit() for character in distance)
+    return distance != "" and all(character in "0123456789" for character in distance)
@@ -0,0 +1,214 @@
+import datetime
+import pathlib
+from collections.abc import Iterator
+
+import numpy as np
+
+from ..data import compression as compressed
+from ..data import instrument, parser, session
+from . import jrt_bb2x, utils
+
+BUFFER_SIZE = 1 << 16
+
+# Bytes every measurement frame starts with: the header, the address and the
+# register of the measurement.
+PREFIX = np.array([jrt_bb2x.HEADER, 0x00, 0x00, 0x22], dtype=np.uint8)
+
+_OFFSETS = np.arange(jrt_bb2x.FRAME_SIZE)
+
+
+class FrameReader:
+    def __init__(self, source, buffer_size=BUFFER_SIZE, clock=None) -> None:
+        """
+        Read measurement frames from the raw byte stream of the laser, such as
+        a serial port, a pty or a recorded file. Bytes are read straight into a
+        preallocated buffer and every whole frame in it is decoded at once.
+        Bytes which do not belong to a valid frame are skipped, so the reader
+        finds the next frame again after noise or a partial frame.
+
+        Args:
+            source: Binary file object with readinto, such as a serial port or
+                    an open file, or the file descriptor of a pty.
+            buffer_size (int, optional): Size of the buffer in bytes, which is
+                                         the most that is read at a time.
+                                         Defaults to BUFFER_SIZE.
+            clock (Callable, optional): Returns the current time in
+                                        milliseconds, which is used as the
+                                        time of every frame read together.
+                                        Timings are unknown if None. Defaults
+                                        to None.
+        """
+        if buffer_size < jrt_bb2x.FRAME_SIZE:
+            raise ValueError(f"The buffer must hold at least {jrt_bb2x.FRAME_SIZE} bytes.")
+        if isinstance(source, int):
+            source = open(source, "rb", buffering=0, closefd=False)
+        self.source = source
+        self.clock = clock
+        self.frames = 0
+        self.skipped_bytes = 0
+        self._buffer = np.zeros(buffer_size, dtype=np.uint8)
+        self._size = 0
+
+    def __iter__(self) -> Iterator[tuple[np.ndarray]]:
+        while (batch := self.read()) is not None:
+            yield batch
+
+    def read(self) -> tuple[np.ndarray]:
+        """
+        Read the next block of bytes and decode the frames completed by it.
+
+        Returns:
+            tuple[np.ndarray]: Timings, distances in m and signal strengths of
+                               the frames, or None at the end of the stream.
+        """
+        count = self._read_into(memoryview(self._buffer)[self._size :])
+        if count == 0:
+            return None
+        self._size += count or 0
+
+        starts = self._find_frames()
+        frames = self._buffer[starts[:, None] + _OFFSETS]
+        distances, _ = jrt_bb2x.decode_frames(frames)
+        self._consume(starts)
+
+        timing = self.clock() if self.clock else parser.NULL_TIMING
+        return (
+            np.full(len(starts), timing, dtype=np.int64),
+            distances / 1000,
+            np.full(len(starts), -1, dtype=np.int64),
+        )
+
+    def _read_into(self, view: memoryview) -> int:
+        try:
+            return self.source.readinto(view)
+        except OSError:
+            # Reading a pty raises once the other end has been closed.
+            return 0
+
+    def _find_frames(self) -> np.ndarray:
+        """
+        Find the start of every valid frame in the buffer. Every header byte
+        is a candidate, and candidates are kept if their prefix and checksum
+        are valid and they do not overlap an earlier frame.
+
+        Returns:
+            np.ndarray: Offset of each frame in the buffer.
+        """
+        data = self._buffer[: self._size]
+        last = len(data) - jrt_bb2x.FRAME_SIZE
+        candidates = np.flatnonzero(data[: max(last + 1, 0)] == jrt_bb2x.HEADER)
+
+        frames = data[candidates[:, None] + _OFFSETS]
+        _, valid = jrt_bb2x.decode_frames(frames)
+        valid &= (frames[:, : len(PREFIX)] == PREFIX).all(axis=1)
+        starts = candidates[valid]
+
+        if np.any(np.diff(starts) < jrt_bb2x.FRAME_SIZE):
+            # A valid frame was found inside another, which should be rare.
+            kept = []
+            for start in starts.tolist():
+                if not kept or start >= kept[-1] + jrt_bb2x.FRAME_SIZE:
+                    kept.append(start)
+            starts = np.array(kept, dtype=np.intp)
+        return starts
+
+    def _consume(self, starts: np.ndarray) -> None:
+        """
+        Drop the decoded frames and skipped bytes from the buffer, moving the
+        bytes which may still begin a frame to the front.
+
+        Args:
+            starts (np.ndarray): Offset of each decoded frame in the buffer.
+        """
+        end = starts[-1] + jrt_bb2x.FRAME_SIZE if len(starts) else 0
+        keep = max(end, self._size - jrt_bb2x.FRAME_SIZE + 1)
+        self.frames += len(starts)
+        self.skipped_bytes += keep - len(starts) * jrt_bb2x.FRAME_SIZE
+
+        remaining = self._size - keep
+        self._buffer[:remaining] = self._buffer[keep : self._size]
+        self._size = remaining
+
+
+def capture(source, file_path: pathlib.Path, clock=None, max_frames=None) -> int:
+    """
+    Capture the raw byte stream of the laser into a session file. Each batch
+    of frames is appended to the session as it is decoded, so memory stays
+    flat however long the capture runs. The session is finished when the
+    stream ends, max_frames is reached or the capture is interrupted. If
+    reading fails, the frames captured so far are still saved before the
+    error is raised.
+
+    Args:
+        source: Binary file object with readinto, or the file descriptor of a
+                pty, as in FrameReader.
+        file_path (pathlib.Path): Path to the session file.
+        clock (Callable, optional): Returns the current time in milliseconds.
+                                    Defaults to local_clock.
+        max_frames (int, optional): Stop after this many frames. Defaults to
+                                    None.
+
+    Returns:
+        int: The number of frames captured.
+    """
+    reader = FrameReader(source, clock=clock or local_clock)
+    error = None
+    with utils.atomic_path(file_path) as temporary:
+        writer = session.SessionWriter(temporary)
+        try:
+            for batch in reader:
+                if max_frames is not None:
+                    batch = [column[: max_frames - writer.rows] for column in batch]
+                writer.append(*batch)
+                if max_frames is not None and writer.rows >= max_frames:
+                    break
+        except KeyboardInterrupt:
+            pass
+        except Exception as exc:
+            error = exc
+        finally:
+            writer.close()
+    if error is not None:
+        raise error
+    return writer.rows
+
+
+@instrument.stage("jrt_bb2x_stream.format_stream_file")
+def format_stream_file(
+    file_path: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> pathlib.Path:
+    """
+    Format a single recording of the raw byte stream of the laser. The
+    recording has no timings, so they are unknown.
+
+    Args:
+        file_path (pathlib.Path): Path to raw byte file.
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+        compression (str, optional): Compress the text file with this
+                                     suffix, such as ".gz". Defaults to None.
+
+    Returns:
+        pathlib.Path: Path to the formatted data file.
+    """
+    with compressed.open_file(file_path, "rb") as f:
+        data = (
+            [(-1, round(distance, 2), -1) for distance in distances.tolist()]
+            for _, distances, _ in FrameReader(f)
+        )
+        file_name = utils.get_file_name(file_path)
+        return utils.write_blocks(destination_folder, file_name, data, binary, compression)
+
+
+def local_clock() -> int:
+    """
+    Get the current local time in milliseconds since midnight, the same
+    timeline as the timings of the other formatted data.
+
+    Returns:
+        int: Milliseconds since midnight.
+    """
+    now = datetime.datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (now - midnight) // datetime.timedelta(milliseconds=1)
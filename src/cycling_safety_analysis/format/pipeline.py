@@ -0,0 +1,259 @@
+import hashlib
+import itertools
+import json
+import os
+import pathlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+from ..data import instrument, session
+from . import registry, utils
+
+MANIFEST_NAME = "manifest.json"
+
+
+class Job:
+    def __init__(
+        self, formatter, source_folder: pathlib.Path, destination_folder: pathlib.Path, **options
+    ) -> None:
+        """
+        Conversion of every file in a raw data folder into a processed data
+        folder.
+
+        Args:
+            formatter (Callable): Module level function which formats a single
+                                  file, such as raspberry_pi.format_text_file.
+                                  It is given the raw file, the destination
+                                  folder and whether to write binary files.
+                                  If None, the formatter of each file is
+                                  found by registry.sniff.
+            source_folder (pathlib.Path): Raw data's folder path.
+            destination_folder (pathlib.Path): Formatted data's folder path.
+            **options: Extra keyword arguments for the formatter, such as the
+                       cache of tof.format_excel_file.
+        """
+        self.formatter = formatter
+        self.source_folder = source_folder
+        self.destination_folder = destination_folder
+        self.options = options
+
+    def formatter_of(self, file_path: pathlib.Path):
+        """
+        Get the formatter of a raw file in the job.
+
+        Args:
+            file_path (pathlib.Path): Path to raw data file.
+
+        Returns:
+            Callable: The formatter, or None if the format is unknown.
+        """
+        return self.formatter or registry.sniff(file_path)
+
+    def output_path(self, file_path: pathlib.Path, binary=False, compression=None) -> pathlib.Path:
+        """
+        Get the path the formatted data of a raw file is written to.
+
+        Args:
+            file_path (pathlib.Path): Path to raw data file.
+            binary (bool, optional): If true, get the path of the binary
+                                     session file. Defaults to False.
+            compression (str, optional): Suffix of the compression of the text
+                                         file, such as ".gz". Defaults to None.
+
+        Returns:
+            pathlib.Path: Path to the formatted data file.
+        """
+        suffix = session.SUFFIX if binary else f".txt{compression or ''}"
+        return self.destination_folder / f"{utils.get_file_name(file_path)}{suffix}"
+
+
+@instrument.stage("pipeline.run", rows_in="jobs", rows_out=len)
+def run(
+    jobs: list[Job],
+    manifest_path: pathlib.Path,
+    binary=False,
+    max_workers=None,
+    force=False,
+    options=None,
+    compression=None,
+) -> list[pathlib.Path]:
+    """
+    Run the conversion jobs, only formatting the raw files whose output is
+    missing or out of date, across a process pool. An output is up to date if
+    it is newer than its raw file, or if the raw file's content hash still
+    matches the one recorded in the manifest. The manifest of every output is
+    written to manifest_path.
+
+    Args:
+        jobs (list[Job]): Jobs to run.
+        manifest_path (pathlib.Path): Path to the JSON manifest of outputs.
+        binary (bool, optional): If true, write binary session files instead
+                                 of text files. Defaults to False.
+        max_workers (int, optional): Number of processes to use. Defaults to
+                                     the number of CPUs.
+        force (bool, optional): If true, format every raw file even if its
+                                output is up to date. Defaults to False.
+        options (dict, optional): Extra keyword arguments for particular
+                                  formatters, keyed on the formatter, such as
+                                  {tof.format_excel_file: {"cache": cache}}.
+                                  Defaults to None.
+        compression (str, optional): Compress the text files with this
+                                     suffix, such as ".gz". Defaults to None.
+
+    Returns:
+        list[pathlib.Path]: Paths to the formatted data files which were
+                            written.
+    """
+    if binary and compression:
+        raise ValueError("Session files cannot be compressed.")
+    manifest = _read_manifest(manifest_path)
+    root = manifest_path.parent
+    options = options or {}
+
+    pending = []
+    unknown = []
+    for job in jobs:
+        file_paths = sorted(p for p in job.source_folder.iterdir() if p.is_file())
+        if file_paths:
+            job.destination_folder.mkdir(parents=True, exist_ok=True)
+        for file_path in file_paths:
+            formatter = job.formatter_of(file_path)
+            if formatter is None:
+                unknown.append(file_path)
+                continue
+            output = job.output_path(file_path, binary, compression)
+            key = pathlib.Path(os.path.relpath(output, root)).as_posix()
+            entry = manifest.get(key)
+            if force or not _is_up_to_date(formatter, file_path, output, entry):
+                kwargs = {**options.get(formatter, {}), **job.options}
+                if compression:
+                    kwargs["compression"] = compression
+                pending.append((formatter, file_path, job.destination_folder, kwargs, key))
+            elif entry is None:
+                manifest[key] = _entry(formatter, file_path, _digest(file_path))
+    if unknown:
+        warnings.warn(f"Skipped {len(unknown)} files of unknown format, such as {unknown[0]}.")
+
+    formatters, file_paths, destination_folders, kwargs, keys = zip(*pending) if pending else [()] * 5
+    arguments = (formatters, file_paths, destination_folders, itertools.repeat(binary), kwargs)
+    if max_workers == 1 or len(pending) <= 1:
+        results = list(map(_format_file, *arguments))
+    else:
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = list(executor.map(_format_file, *arguments))
+
+    written = []
+    for formatter, file_path, key, (output, digest) in zip(formatters, file_paths, keys, results):
+        manifest[key] = _entry(formatter, file_path, digest)
+        written.append(output)
+
+    _write_manifest(manifest_path, manifest)
+    return written
+
+
+def convert_tree(
+    source_root: pathlib.Path,
+    destination_root: pathlib.Path,
+    manifest_path=None,
+    binary=False,
+    max_workers=None,
+    force=False,
+    options=None,
+    compression=None,
+) -> list[pathlib.Path]:
+    """
+    Format every raw file under a folder, whatever mix of sensors it holds.
+    The format of each file is found by registry.sniff, and the formatted
+    data is written to the same relative folder under destination_root.
+
+    Args:
+        source_root (pathlib.Path): Raw data's root folder path.
+        destination_root (pathlib.Path): Formatted data's root folder path.
+        manifest_path (pathlib.Path, optional): Path to the JSON manifest of
+                                                outputs. Defaults to
+                                                MANIFEST_NAME in
+                                                destination_root.
+        binary (bool, optional): If true, write binary session files instead
+                                 of text files. Defaults to False.
+        max_workers (int, optional): Number of processes to use. Defaults to
+                                     the number of CPUs.
+        force (bool, optional): If true, format every raw file even if its
+                                output is up to date. Defaults to False.
+        options (dict, optional): Extra keyword arguments for particular
+                                  formatters, as in run. Defaults to None.
+        compression (str, optional): Compress the text files with this
+                                     suffix, such as ".gz". Defaults to None.
+
+    Returns:
+        list[pathlib.Path]: Paths to the formatted data files which were
+                            written.
+    """
+    folders = [source_root, *sorted(p for p in source_root.rglob("*") if p.is_dir())]
+    jobs = [Job(None, folder, destination_root / folder.relative_to(source_root)) for folder in folders]
+    manifest_path = manifest_path or destination_root / MANIFEST_NAME
+    return run(jobs, manifest_path, binary, max_workers, force, options, compression)
+
+
+def _name(formatter) -> str:
+    return f"{formatter.__module__}.{formatter.__qualname__}"
+
+
+def _is_up_to_date(formatter, file_path: pathlib.Path, output: pathlib.Path, entry: dict) -> bool:
+    """
+    Check if the output of a raw file can be reused. The content hash is only
+    computed if the modification times do not already show that it can.
+
+    Args:
+        formatter (Callable): Formatter of the raw file.
+        file_path (pathlib.Path): Path to raw data file.
+        output (pathlib.Path): Path to the formatted data file.
+        entry (dict): Manifest entry of the output, or None.
+
+    Returns:
+        bool: True if the output does not need to be written again.
+    """
+    if not output.exists():
+        return False
+    if entry is not None and entry["formatter"] != _name(formatter):
+        return False
+    if output.stat().st_mtime_ns >= file_path.stat().st_mtime_ns:
+        return True
+    if entry is not None and entry["source_digest"] == _digest(file_path):
+        # The raw file was copied again without changing. Touch the output so
+        # that the modification times are enough next time.
+        os.utime(output)
+        return True
+    return False
+
+
+def _format_file(
+    formatter, file_path: pathlib.Path, destination_folder: pathlib.Path, binary: bool, options: dict
+) -> tuple:
+    return formatter(file_path, destination_folder, binary, **options), _digest(file_path)
+
+
+def _entry(formatter, file_path: pathlib.Path, digest: str) -> dict:
+    return {"source": file_path.as_posix(), "source_digest": digest, "formatter": _name(formatter)}
+
+
+def _read_manifest(manifest_path: pathlib.Path) -> dict:
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest_path: pathlib.Path, manifest: dict) -> None:
+    temporary = manifest_path.with_suffix(".tmp")
+    with open(temporary, "w") as f:
+        json.dump(dict(sorted(manifest.items())), f, indent=2)
+        f.write("\n")
+    os.replace(temporary, manifest_path)
+
+
+def _digest(file_path: pathlib.Path) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,39 +1,74 @@
+import itertools
 import pathlib
+from collections.abc import Iterator
 
+from ..data import compression as compressed
+from ..data import instrument
 from . import utils
 
 
-def format_text(source_folder: pathlib.Path, destination_folder: pathlib.Path) -> None:
+def format_text(
+    source_folder: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> None:
     """
     Format the laser data collected by the Raspberry Pi.
 
     Args:
         source_folder (pathlib.Path): Raw data's folder path.
         destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write binary session files instead
+                                 of text files. Defaults to False.
+        compression (str, optional): Compress the text files with this
+                                     suffix, such as ".gz". Defaults to None.
     """
     for file_path in source_folder.iterdir():
-        file_name = utils.get_file_name(file_path)
-        data = _get_text_data(file_path)
-        utils.write_data_to_file(destination_folder, file_name, data)
+        format_text_file(file_path, destination_folder, binary, compression=compression)
 
 
-def _get_text_data(file_path: pathlib.Path) -> list[float]:
+@instrument.stage("raspberry_pi.format_text_file")
+def format_text_file(
+    file_path: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> pathlib.Path:
     """
-    Helper function that formats a file of laser data collected by the
-    Raspberry Pi.
+    Format a single file of laser data collected by the Raspberry Pi.
 
     Args:
         file_path (pathlib.Path): Path to raw data file.
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+        compression (str, optional): Compress the text file with this
+                                     suffix, such as ".gz". Defaults to None.
 
     Returns:
-        list[float]: List of distance data.
+        pathlib.Path: Path to the formatted data file.
+    """
+    data = _iter_text_blocks(file_path)
+    return utils.write_blocks(destination_folder, utils.get_file_name(file_path), data, binary, compression)
+
+
+def _iter_text_blocks(
+    file_path: pathlib.Path, block_size=utils.BLOCK_SIZE
+) -> Iterator[list[tuple]]:
+    """
+    Helper function that formats a file of laser data collected by the
+    Raspberry Pi, block_size lines at a time.
+
+    Args:
+        file_path (pathlib.Path): Path to raw data file.
+        block_size (int, optional): Number of lines in each block. Defaults to
+                                    utils.BLOCK_SIZE.
+
+    Yields:
+        list[tuple]: Block of formatted distance data.
     """
-    data = []
-    with open(file_path) as f:
-        for line in f.readlines():
-            _, distance, _ = line.rstrip().split(" ")
-            distance = float(distance)
-            if distance != -1:
-                distance = round(distance / 1000, 2)
-            data.append((-1, distance, -1))
-    return data
+    with compressed.open_file(file_path) as f:
+        while lines := list(itertools.islice(f, block_size)):
+            block = []
+            for line in lines:
+                _, distance, _ = line.rstrip().split(" ")
+                distance = float(distance)
+                if distance != -1:
+                    distance = round(distance / 1000, 2)
+                block.append((-1, distance, -1))
+            yield block
@@ -0,0 +1,77 @@
+import pathlib
+import re
+
+from ..data import compression as compressed
+from . import jrt_bb2x, jrt_bb2x_stream, raspberry_pi, tof
+
+# Number of bytes read from the start of a file to tell its format.
+SNIFF_SIZE = 512
+
+_BOM = b"\xef\xbb\xbf"
+_BRACKETED_LINE = re.compile(rb"\[[^\]\n]*\]([^\n]*)")
+_PROTOCOL_PAYLOAD = re.compile(rb"\s*[0-9A-Fa-f]{2}( [0-9A-Fa-f]{2}){%d}" % (jrt_bb2x.FRAME_SIZE - 1))
+_TEXT_LINE = re.compile(rb"\d{2}:\d{2}:\d{2}(\.\d+)? -?[\d.]+ -?[\d.]+\s")
+
+_FORMATS = []
+
+
+def register(test, formatter) -> None:
+    """
+    Register a raw data format. Formats registered later are tried first, so
+    a new format can take over files matched by a built in one.
+
+    Args:
+        test (Callable): Given the first SNIFF_SIZE bytes of a file, returns
+                         true if the file is in this format.
+        formatter (Callable): Module level function which formats a single
+                              file, as given to pipeline.Job.
+    """
+    _FORMATS.insert(0, (test, formatter))
+
+
+def sniff(file_path: pathlib.Path):
+    """
+    Find the formatter of a raw data file from its first bytes.
+
+    Args:
+        file_path (pathlib.Path): Path to raw data file.
+
+    Returns:
+        Callable: The formatter of the file, or None if the format is unknown.
+    """
+    with compressed.open_file(file_path, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+    for test, formatter in _FORMATS:
+        if test(head):
+            return formatter
+    return None
+
+
+def _is_excel(head: bytes) -> bool:
+    # Workbooks are zip archives.
+    return head.startswith(b"PK\x03\x04")
+
+
+def _is_protocol(head: bytes) -> bool:
+    match = _BRACKETED_LINE.match(head.removeprefix(_BOM))
+    return bool(match and _PROTOCOL_PAYLOAD.match(match.group(1)))
+
+
+def _is_ascii(head: bytes) -> bool:
+    match = _BRACKETED_LINE.match(head.removeprefix(_BOM))
+    return bool(match and not _PROTOCOL_PAYLOAD.match(match.group(1)))
+
+
+def _is_text(head: bytes) -> bool:
+    return bool(_TEXT_LINE.match(head.removeprefix(_BOM)))
+
+
+def _is_stream(head: bytes) -> bool:
+    return bytes(jrt_bb2x_stream.PREFIX) in head
+
+
+register(_is_stream, jrt_bb2x_stream.format_stream_file)
+register(_is_text, raspberry_pi.format_text_file)
+register(_is_ascii, jrt_bb2x.format_ascii_file)
+register(_is_protocol, jrt_bb2x.format_protocol_file)
+register(_is_excel, tof.format_excel_file)
@@ -1,36 +1,143 @@
+import io
 import pathlib
+from collections.abc import Iterable, Iterator
 
-import pandas as pd
+import numpy as np
+import openpyxl
 
+from ..data import compression as compressed
+from ..data import instrument
 from . import utils
 
+DISTANCE_COLUMN = "distance(m)"
 
-def format_excel(source_folder: pathlib.Path, destination_folder: pathlib.Path) -> None:
+
+def format_excel(
+    source_folder: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None
+) -> None:
     """
     Helper function to format data collected in excel files from WaveShare's default software.
 
     Args:
         source_folder (pathlib.Path): Raw data's folder path.
         destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write binary session files instead
+                                 of text files. Defaults to False.
+        compression (str, optional): Compress the text files with this
+                                     suffix, such as ".gz". Defaults to None.
     """
     for file_path in source_folder.iterdir():
-        file_name = utils.get_file_name(file_path)
-        data = pd.read_excel(file_path)["distance(m)"]
-        data = _pad_distance_data(data)
-        utils.write_data_to_file(destination_folder, file_name, data)
+        format_excel_file(file_path, destination_folder, binary, compression=compression)
 
 
-def _pad_distance_data(data: list) -> list[tuple]:
+@instrument.stage("tof.format_excel_file")
+def format_excel_file(
+    file_path: pathlib.Path, destination_folder: pathlib.Path, binary=False, compression=None, cache=None
+) -> pathlib.Path:
     """
-    Helper function to format the data correctly.
+    Format a single excel file from WaveShare's default software.
 
     Args:
-        data (list): List of distance data extracted from the excel file.
+        file_path (pathlib.Path): Path to raw data file.
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+        compression (str, optional): Compress the text file with this
+                                     suffix, such as ".gz". Defaults to None.
+        cache (ParseCache, optional): Cache of the distances read from each
+                                      workbook, so that an unchanged workbook
+                                      is never opened again. Defaults to None.
 
     Returns:
-        list[tuple]: Format it as (timing, distance, signal_strength)
+        pathlib.Path: Path to the formatted data file.
+    """
+    if cache is None:
+        distances = _iter_distances(file_path)
+    else:
+        distances = _iter_array(_read_distances_with_cache(file_path, cache))
+    data = utils.blocks(_pad_distance_data(distances))
+    return utils.write_blocks(destination_folder, utils.get_file_name(file_path), data, binary, compression)
+
+
+def _iter_distances(file_path: pathlib.Path) -> Iterator[float]:
+    """
+    Read the distance column of the first sheet of a workbook row by row,
+    without loading the rest of the sheet.
+
+    Args:
+        file_path (pathlib.Path): Path to raw data file.
+
+    Yields:
+        float: Distance in m, NaN if the cell is empty.
+    """
+    if compressed.is_compressed(file_path):
+        # Workbooks are zip archives which need to be seekable, so a
+        # compressed workbook is decompressed into memory first.
+        with compressed.open_file(file_path, "rb") as f:
+            file_path = io.BytesIO(f.read())
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        if DISTANCE_COLUMN not in header:
+            raise ValueError(f"{file_path} has no {DISTANCE_COLUMN} column.")
+        column = header.index(DISTANCE_COLUMN) + 1
+
+        rows = sheet.iter_rows(min_row=2, min_col=column, max_col=column, values_only=True)
+        for (distance,) in rows:
+            yield float("nan") if distance is None else distance
+    finally:
+        workbook.close()
+
+
+def _iter_array(distances: np.ndarray, block_size=utils.BLOCK_SIZE) -> Iterator[float]:
+    """
+    Yield the distances of an array as Python floats, converting
+    block_size of them at a time rather than the whole array at once.
+
+    Args:
+        distances (np.ndarray): Distance in m of each row.
+        block_size (int, optional): Number of distances converted at a time.
+                                    Defaults to utils.BLOCK_SIZE.
+
+    Yields:
+        float: Distance in m.
+    """
+    for start in range(0, len(distances), block_size):
+        yield from distances[start : start + block_size].tolist()
+
+
+def _read_distances_with_cache(file_path: pathlib.Path, cache) -> np.ndarray:
+    """
+    Read the distance column of a workbook, using the cached column if the
+    workbook has not changed since it was last read.
+
+    Args:
+        file_path (pathlib.Path): Path to raw data file.
+        cache (ParseCache): Cache of the distances read from each workbook.
+
+    Returns:
+        np.ndarray: Distance in m of each row.
+    """
+    data = cache.get(file_path)
+    if data is not None:
+        return data[1]
+
+    distances = np.fromiter(_iter_distances(file_path), dtype=np.float64)
+    unknown = np.full(len(distances), -1, dtype=np.int64)
+    cache.put(file_path, (unknown, distances, unknown))
+    return distances
+
+
+def _pad_distance_data(data: Iterable[float]) -> Iterator[tuple]:
+    """
+    Helper function to format the data correctly.
+
+    Args:
+        data (Iterable[float]): Distance data extracted from the excel file.
+
+    Yields:
+        tuple: Format it as (timing, distance, signal_strength)
     """
-    new_data = []
     for distance in data:
-        new_data.append((-1, distance, -1))
-    return new_data
+        yield (-1, distance, -1)
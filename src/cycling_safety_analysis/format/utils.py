@@ -1,4 +1,16 @@
+import contextlib
+import itertools
+import os
 import pathlib
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+
+from ..data import compression as compressed
+from ..data import instrument, parser, session
+
+# Number of rows the converters read and write at a time.
+BLOCK_SIZE = 65536
 
 
 def get_file_name(file_path: pathlib.Path) -> str:
@@ -15,7 +27,24 @@ def get_file_name(file_path: pathlib.Path) -> str:
     return file_path.name.split(".")[0]
 
 
-def write_data_to_file(destination_folder: pathlib.Path, file_name: str, data: list[float]) -> None:
+def blocks(rows: Iterable[tuple], block_size=BLOCK_SIZE) -> Iterator[list[tuple]]:
+    """
+    Group rows of formatted data into blocks.
+
+    Args:
+        rows (Iterable[tuple]): Rows of (timing, distance, signal_strength).
+        block_size (int, optional): Number of rows in each block. Defaults to
+                                    BLOCK_SIZE.
+
+    Yields:
+        list[tuple]: Up to block_size rows.
+    """
+    rows = iter(rows)
+    while block := list(itertools.islice(rows, block_size)):
+        yield block
+
+
+def write_data_to_file(destination_folder: pathlib.Path, file_name: str, data: list[float]) -> pathlib.Path:
     """
     Write the formatted list of data to the new data file.
 
@@ -23,7 +52,167 @@ def write_data_to_file(destination_folder: pathlib.Path, file_name: str, data: l
         destination_folder (pathlib.Path): Formatted data's folder path.
         file_name (str): Formatted data's file name.
         data (list[float]): Formatted data to be written.
+
+    Returns:
+        pathlib.Path: Path to the new data file.
+    """
+    return write_blocks_to_file(destination_folder, file_name, blocks(data))
+
+
+def write_data_to_session(destination_folder: pathlib.Path, file_name: str, data: list[float]) -> pathlib.Path:
+    """
+    Write the formatted list of data to a binary session file which can be
+    memory-mapped by the loader.
+
+    Args:
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        file_name (str): Formatted data's file name.
+        data (list[float]): Formatted data to be written.
+
+    Returns:
+        pathlib.Path: Path to the new session file.
+    """
+    return write_blocks_to_session(destination_folder, file_name, blocks(data))
+
+
+def write_data(destination_folder: pathlib.Path, file_name: str, data: list[float], binary=False) -> pathlib.Path:
+    """
+    Write the formatted data either as text or as a binary session.
+
+    Args:
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        file_name (str): Formatted data's file name.
+        data (list[float]): Formatted data to be written.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+
+    Returns:
+        pathlib.Path: Path to the written file.
+    """
+    return write_blocks(destination_folder, file_name, blocks(data), binary)
+
+
+def write_blocks_to_file(
+    destination_folder: pathlib.Path, file_name: str, data: Iterable[list[tuple]], compression=None
+) -> pathlib.Path:
+    """
+    Write blocks of formatted data to the new data file, with a single write
+    for each block. The file only appears once every block is written.
+
+    Args:
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        file_name (str): Formatted data's file name.
+        data (Iterable[list[tuple]]): Blocks of formatted data to be written.
+        compression (str, optional): Compress the file with this suffix, such
+                                     as ".gz". Defaults to None.
+
+    Returns:
+        pathlib.Path: Path to the new data file.
+    """
+    file_path = destination_folder / f"{file_name}.txt{compression or ''}"
+    with (
+        atomic_path(file_path) as temporary,
+        compressed.open_file(temporary, "w", compression) as f,
+    ):
+        for block in data:
+            f.write("".join(f"{t} {d:.2f} {s}\n" for t, d, s in block))
+    return file_path
+
+
+def write_blocks_to_session(
+    destination_folder: pathlib.Path, file_name: str, data: Iterable[list[tuple]]
+) -> pathlib.Path:
+    """
+    Write blocks of formatted data to a binary session file. The file only
+    appears once every block is written. Distances are rounded to 2 decimal
+    places, as in the text files.
+
+    Args:
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        file_name (str): Formatted data's file name.
+        data (Iterable[list[tuple]]): Blocks of formatted data to be written.
+
+    Returns:
+        pathlib.Path: Path to the new session file.
+    """
+    file_path = destination_folder / f"{file_name}{session.SUFFIX}"
+    with (
+        atomic_path(file_path) as temporary,
+        session.SessionWriter(temporary) as writer,
+    ):
+        for block in filter(None, data):
+            timings, distances, strengths = zip(*block)
+            writer.append(
+                parser.parse_timings([str(timing) for timing in timings]),
+                _round_distances(np.array(distances, dtype=float)),
+                np.array(strengths, dtype=np.int64),
+            )
+    return file_path
+
+
+def write_blocks(
+    destination_folder: pathlib.Path,
+    file_name: str,
+    data: Iterable[list[tuple]],
+    binary=False,
+    compression=None,
+) -> pathlib.Path:
+    """
+    Write blocks of formatted data either as text or as a binary session.
+
+    Args:
+        destination_folder (pathlib.Path): Formatted data's folder path.
+        file_name (str): Formatted data's file name.
+        data (Iterable[list[tuple]]): Blocks of formatted data to be written.
+        binary (bool, optional): If true, write a binary session file instead
+                                 of a text file. Defaults to False.
+        compression (str, optional): Compress the text file with this suffix,
+                                     such as ".gz". Session files are never
+                                     compressed so that they can be
+                                     memory-mapped. Defaults to None.
+
+    Returns:
+        pathlib.Path: Path to the written file.
+    """
+    data = instrument.count_rows("format.rows_written", data)
+    if binary:
+        if compression:
+            raise ValueError("Session files cannot be compressed.")
+        return write_blocks_to_session(destination_folder, file_name, data)
+    return write_blocks_to_file(destination_folder, file_name, data, compression)
+
+
+def _round_distances(distances: np.ndarray) -> np.ndarray:
+    """
+    Round distances to 2 decimal places, as written to the text files.
+    Distances too large to have any decimal places, such as those of corrupt
+    frames, are kept as they are, as scaling them by 100 to round them would
+    change them.
+
+    Args:
+        distances (np.ndarray): Distances.
+
+    Returns:
+        np.ndarray: The rounded distances.
+    """
+    return np.where(np.abs(distances) < 2**52 / 100, np.round(distances, 2), distances)
+
+
+@contextlib.contextmanager
+def atomic_path(file_path: pathlib.Path) -> Iterator[pathlib.Path]:
+    """
+    Give a temporary path to write a file to, which replaces file_path once
+    the file is complete and is removed if writing fails.
+
+    Args:
+        file_path (pathlib.Path): Path to the final file.
+
+    Yields:
+        pathlib.Path: Temporary path in the same folder.
     """
-    with open(destination_folder / f"{file_name}.txt", "w") as f:
-        for timing, distance, strength in data:
-            f.write(f"{timing} {distance:.2f} {strength}\n")
+    temporary = file_path.with_name(f".{file_path.name}.tmp")
+    try:
+        yield temporary
+        os.replace(temporary, file_path)
+    finally:
+        temporary.unlink(missing_ok=True)
@@ -1,7 +1,9 @@
 import matplotlib as mpl
 import numpy as np
 
-INTERVALS = [0.5 * i for i in range(1, 11)]
+from ..data import calibration, instrument, ragged
+
+INTERVALS = calibration.INTERVALS
 
 
 def plot_mean_vs_actual_distance(ax: mpl.axes.Axes, mean: list, title="") -> None:
@@ -25,6 +27,7 @@ def plot_mean_vs_actual_distance(ax: mpl.axes.Axes, mean: list, title="") -> Non
     )
 
 
+@instrument.stage("basic_graphs.plot_scatter")
 def plot_scatter(ax: mpl.axes.Axes, data: list[list], title="") -> None:
     """
     Plot a scatter plot of all the points measured by the sensor at each distance interval.
@@ -58,6 +61,7 @@ def plot_std_errorbar(ax: mpl.axes.Axes, mean: list, std: list, title="") -> Non
     _set_info(ax, title, "Actual Distance (m)", "Measured Points (m)")
 
 
+@instrument.stage("basic_graphs.plot_best_fit_scatter")
 def plot_best_fit_scatter(ax: mpl.axes.Axes, data: list[list], title="") -> None:
     """
     Given a scatter of all the points measured by the sensor, plot a best fit line.
@@ -122,11 +126,15 @@ def _flatten(data: list[list]) -> tuple[list]:
 
     Args:
         data (list[list]): data[i] is the list of points measured by the sensor at the ith
-                            distance interval.
+                            distance interval, or a Ragged array of them.
 
     Returns:
-        tuple[list]]: measurements x, and respective distant intervals y.
+        tuple[list]]: measurements x, and respective distant intervals y. These are
+                      arrays if given a Ragged array.
     """
+    if isinstance(data, ragged.Ragged):
+        lengths = data.lengths[: len(INTERVALS)]
+        return np.repeat(INTERVALS[: len(lengths)], lengths), data.values[: lengths.sum()]
 
     x, y = [], []
 
@@ -0,0 +1,274 @@
+import pathlib
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from ..data import parser, processing
+
+# Time of day in a file name, such as 3-Car_14_55_38.jpg or 1-Taxi_14-55-22.jpg.
+TIME_PATTERN = re.compile(r"(\d{2})[_-](\d{2})[_-](\d{2})")
+
+# Largest width and height of a thumbnail in pixels.
+THUMBNAIL_SIZE = (800, 800)
+
+
+class ThumbnailCache:
+    def __init__(
+        self, images: list[pathlib.Path], size=THUMBNAIL_SIZE, capacity=32, nearby=2, workers=1
+    ) -> None:
+        """
+        Decode images as downsampled thumbnails, keeping the most recently
+        used ones so that showing an image again costs nothing. The images
+        either side of each one got are decoded ahead of time on background
+        threads, as they are likely to be shown next.
+
+        Args:
+            images (list[pathlib.Path]): Image paths.
+            size (tuple[int], optional): Largest width and height of a
+                                         thumbnail. Defaults to
+                                         THUMBNAIL_SIZE.
+            capacity (int, optional): Most thumbnails kept. Defaults to 32.
+            nearby (int, optional): Number of images either side of each one
+                                    got to decode ahead of time. Defaults to
+                                    2.
+            workers (int, optional): Background threads which decode images.
+                                     Defaults to 1.
+        """
+        self.images = list(images)
+        self.size = size
+        self.capacity = capacity
+        self.nearby = nearby
+        self._thumbnails = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="thumbnails")
+        self._closed = False
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def __enter__(self) -> "ThumbnailCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, i: int) -> np.ndarray:
+        """
+        Get the thumbnail of an image, decoding it if it is not cached, and
+        start decoding the images near it.
+
+        Args:
+            i (int): Position of the image.
+
+        Returns:
+            np.ndarray: The thumbnail's pixels.
+        """
+        self.prefetch(j for step in range(1, self.nearby + 1) for j in (i + step, i - step))
+        with self._lock:
+            if i in self._thumbnails:
+                self._thumbnails.move_to_end(i)
+                return self._thumbnails[i]
+            pending = self._pending.get(i)
+        if pending is not None:
+            return pending.result()
+        return self._store(i, load_thumbnail(self.images[i], self.size))
+
+    def prefetch(self, indices) -> None:
+        """
+        Decode images on the background threads if they are not cached. Does
+        nothing once the cache is closed.
+
+        Args:
+            indices (Iterable[int]): Positions of the images.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            for i in indices:
+                if 0 <= i < len(self.images) and i not in self._thumbnails and i not in self._pending:
+                    self._pending[i] = self._executor.submit(self._decode, i)
+
+    def close(self) -> None:
+        """
+        Stop the background threads and drop the cached thumbnails. Images
+        got after this are decoded on the calling thread.
+        """
+        with self._lock:
+            self._closed = True
+            self._thumbnails.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _decode(self, i: int) -> np.ndarray:
+        try:
+            return self._store(i, load_thumbnail(self.images[i], self.size))
+        finally:
+            with self._lock:
+                self._pending.pop(i, None)
+
+    def _store(self, i: int, thumbnail: np.ndarray) -> np.ndarray:
+        with self._lock:
+            self._thumbnails[i] = thumbnail
+            self._thumbnails.move_to_end(i)
+            while len(self._thumbnails) > self.capacity:
+                self._thumbnails.popitem(last=False)
+        return thumbnail
+
+
+class ImageIndex:
+    def __init__(
+        self,
+        images: list[pathlib.Path],
+        tolerance=5000,
+        offset=0,
+        size=THUMBNAIL_SIZE,
+        capacity=32,
+        nearby=2,
+    ) -> None:
+        """
+        Join camera frames to sensor samples by the time of day in each
+        frame's file name. Frames are decoded as thumbnails through a
+        ThumbnailCache, which decodes the frames either side of each one
+        shown in the background.
+
+        Args:
+            images (list[pathlib.Path]): Image paths. Images without a time in
+                                         their name are left out.
+            tolerance (int, optional): Furthest a frame can be from a sample,
+                                       in milliseconds, to be joined to it.
+                                       None for no limit. Defaults to 5000.
+            offset (int, optional): Milliseconds added to the time of every
+                                    frame, to correct for the camera's clock.
+                                    Defaults to 0.
+            size (tuple[int], optional): Largest width and height of a
+                                         thumbnail. Defaults to
+                                         THUMBNAIL_SIZE.
+            capacity (int, optional): Most thumbnails kept. Defaults to 32.
+            nearby (int, optional): Number of frames either side of the
+                                    frame shown to decode ahead of time.
+                                    Defaults to 2.
+        """
+        images = [pathlib.Path(image) for image in images]
+        timings = np.array([parse_timestamp(image) for image in images], dtype=np.int64)
+        known = np.flatnonzero(timings != parser.NULL_TIMING)
+        order = known[np.argsort(timings[known], kind="stable")]
+
+        self.images = [images[i] for i in order]
+        self.timings = timings[order] + offset
+        self.tolerance = tolerance
+        self.thumbnails = ThumbnailCache(self.images, size, capacity, nearby)
+
+    @classmethod
+    def from_folder(cls, folder: pathlib.Path, pattern="*", **kwargs) -> "ImageIndex":
+        """
+        Index every image in a folder.
+
+        Args:
+            folder (pathlib.Path): Folder of images.
+            pattern (str, optional): Glob of the images. Defaults to "*".
+            **kwargs: Options of ImageIndex.
+
+        Returns:
+            ImageIndex: The index of the images.
+        """
+        return cls(sorted(pathlib.Path(folder).glob(pattern)), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def match(self, timings) -> np.ndarray:
+        """
+        Find the frame taken nearest to each timing. Ties go to the earlier
+        frame.
+
+        Args:
+            timings: Milliseconds since midnight or epoch, or datetime
+                     objects.
+
+        Returns:
+            np.ndarray: Position of each frame, or -1 if no frame is within
+                        the tolerance.
+        """
+        timings = processing.to_milliseconds(np.atleast_1d(timings)) % parser.MILLISECONDS_PER_DAY
+        if len(self) == 0:
+            return np.full(len(timings), -1)
+
+        after = np.minimum(np.searchsorted(self.timings, timings, "left"), len(self) - 1)
+        before = np.maximum(after - 1, 0)
+        nearest = np.where(
+            np.abs(timings - self.timings[before]) <= np.abs(self.timings[after] - timings), before, after
+        )
+        if self.tolerance is not None:
+            nearest[np.abs(self.timings[nearest] - timings) > self.tolerance] = -1
+        return nearest
+
+    def nearest(self, timing) -> int:
+        """
+        Find the frame taken nearest to a timing.
+
+        Args:
+            timing: Milliseconds since midnight or epoch, or a datetime.
+
+        Returns:
+            int: Position of the frame, or -1 if no frame is within the
+                 tolerance.
+        """
+        return int(self.match(timing)[0])
+
+    def thumbnail(self, i: int) -> np.ndarray:
+        """
+        Get the thumbnail of a frame, see ThumbnailCache.get.
+
+        Args:
+            i (int): Position of the frame.
+
+        Returns:
+            np.ndarray: The thumbnail's pixels.
+        """
+        return self.thumbnails.get(i)
+
+    def close(self) -> None:
+        self.thumbnails.close()
+
+
+def parse_timestamp(file_path: pathlib.Path) -> int:
+    """
+    Get the time of day in a file name, such as 14-55-22 or 14_55_22. If the
+    name holds several, the last is used.
+
+    Args:
+        file_path (pathlib.Path): Path to file.
+
+    Returns:
+        int: Milliseconds since midnight, or -1 if the name has no time.
+    """
+    matches = TIME_PATTERN.findall(pathlib.Path(file_path).stem)
+    if not matches:
+        return parser.NULL_TIMING
+    hours, minutes, seconds = (int(value) for value in matches[-1])
+    if hours > 23 or minutes > 59 or seconds > 59:
+        return parser.NULL_TIMING
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000
+
+
+def load_thumbnail(file_path: pathlib.Path, size=THUMBNAIL_SIZE) -> np.ndarray:
+    """
+    Decode an image no larger than size. JPEGs are decoded at a reduced scale
+    rather than decoded in full and then shrunk.
+
+    Args:
+        file_path (pathlib.Path): Path to image.
+        size (tuple[int], optional): Largest width and height. Defaults to
+                                     THUMBNAIL_SIZE.
+
+    Returns:
+        np.ndarray: The image's pixels.
+    """
+    with Image.open(file_path) as image:
+        image.draft(image.mode, size)
+        image.thumbnail(size)
+        return np.asarray(image)
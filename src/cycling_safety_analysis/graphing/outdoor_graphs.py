@@ -1,16 +1,17 @@
 import pathlib
+import weakref
 from datetime import datetime
 
 import matplotlib as mpl
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-from PIL import Image
 
-from ..data import analysis, processing
+from ..data import analysis, instrument, processing
+from . import images
 
 
+@instrument.stage("outdoor_graphs.scatter_time_vs_distance", rows_in="y")
 def scatter_time_vs_distance(
     ax: mpl.axes.Axes,
     x: list[datetime],
@@ -19,22 +20,41 @@ def scatter_time_vs_distance(
     intervals=30,
     rotate_xticks=False,
     alpha=0.2,
+    decimate=None,
     **kwargs,
 ) -> None:
     """
     Plot a time vs distance scatter graph.
 
+    Long rides can be decimated to the nearest and furthest point in each
+    pixel column, which looks the same but draws far fewer points. The
+    nearest point of every column is kept, so no close pass is lost, but the
+    shading of overlapping points is not kept.
+
     Args:
         ax (mpl.axes.Axes): Axes object to plot graph on.
-        x (list[datetime]): x-values which are datetime objects.
+        x (list[datetime]): x-values which are datetime objects or integer
+                            milliseconds, such as milliseconds since
+                            midnight.
         y (list[int]): y-values representing distances.
         title (str, optional): Title of graph. Defaults to "".
         intervals (int, optional): Time intervals between xticks. Defaults to
                                    30.
         rotate_xticks (bool, optional): Set to true to rotate xticks to make
                                         more space. Defaults to False.
+        decimate (optional): True to decimate to the width of the axes in
+                             pixels, or the number of columns to decimate
+                             to. Defaults to None.
     """
-    x, y = _clean_null_values(x, y)
+    x, y = _clean_null_values(_to_datetimes(x), y)
+    if decimate and len(y):
+        columns = int(ax.bbox.width) if decimate is True else int(decimate)
+        timestamps = processing.to_milliseconds(x)
+        kept = _min_max_indices(timestamps, np.asarray(y), columns)
+        instrument.count("outdoor_graphs.decimated_points", len(y) - len(kept))
+        x, y = _to_datetimes(timestamps[kept]), np.asarray(y)[kept]
+        if np.ndim(kwargs.get("c")) == 1:
+            kwargs["c"] = np.asarray(kwargs["c"])[kept]
     ax.scatter(x, y, s=20, alpha=alpha, **kwargs)
     _set_info(ax, title)
     _set_xtick_intervals(ax, intervals)
@@ -43,6 +63,7 @@ def scatter_time_vs_distance(
         _rotate_xticks(ax)
 
 
+@instrument.stage("outdoor_graphs.scatter_clusters_with_dbscan", rows_in="y")
 def scatter_clusters_with_dbscan(
     ax: mpl.axes.Axes,
     x: list[datetime],
@@ -56,7 +77,9 @@ def scatter_clusters_with_dbscan(
 
     Args:
         ax (mpl.axes.Axes): Axes object to plot graph on.
-        x (list[datetime]): x-values which are datetime objects.
+        x (list[datetime]): x-values which are datetime objects or integer
+                            milliseconds, such as milliseconds since
+                            midnight.
         y (list[int]): y-values representing distances.
         title (str, optional): Title of graph. Defaults to "".
         intervals (int, optional): Time intervals between xticks. Defaults to
@@ -64,12 +87,9 @@ def scatter_clusters_with_dbscan(
         rotate_xticks (bool, optional): Set to true to rotate xticks to make
                                         more space. Defaults to False.
     """
-    x, y = _clean_null_values(x, y)
-    timestamps = processing.datetime_to_timestamps(x)
-
-    df = pd.DataFrame({"datetime": x, "distance": y, "timestamp": timestamps})
+    x, y = _clean_null_values(_to_datetimes(x), y)
+    timestamps = processing.to_milliseconds(x)
     clusters = analysis.find_clusters_DBSCAN(timestamps, y)
-    df["clusters"] = clusters
 
     scatter_time_vs_distance(
         ax,
@@ -82,13 +102,18 @@ def scatter_clusters_with_dbscan(
         edgecolors="k",
     )
 
-    for cluster_id in [c for c in df["clusters"].unique() if c != -1]:
-        cluster_data = df[df["clusters"] == cluster_id]
-        centroid_x = cluster_data["datetime"].mean()
-        centroid_y = cluster_data["distance"].mean()
-        ax.plot(centroid_x, centroid_y, "bo", fillstyle="none", markersize=20)
+    passes = analysis.summarize_passes(timestamps, y, clusters)
+    ax.plot(
+        _to_datetimes(passes["mean_time"]),
+        passes["mean_distance"],
+        "bo",
+        linestyle="none",
+        fillstyle="none",
+        markersize=20,
+    )
 
 
+@instrument.stage("outdoor_graphs.interactive_scatter", rows_in="y")
 def interactive_scatter(
     fig: mpl.figure.Figure,
     ax_1: mpl.axes.Axes,
@@ -97,32 +122,84 @@ def interactive_scatter(
     x: list[datetime],
     y: list[int],
     title="",
+    image_index=None,
     **kwargs,
 ) -> None:
     """
     Plot an interactive scatter where the user can see each image associated
-    with each point on the scatter.
+    with each point on the scatter. Images are shown as thumbnails, which are
+    cached and decoded ahead of time. The cache of the images is closed with
+    the figure, while an image_index is left open for its owner to close.
 
     Args:
         fig (mpl.figure.Figure): Matplot
         ax_1 (mpl.axes.Axes): Axes to plot scatter.
         ax_2 (_type_): Axes to print image on.
-        images (list[pathlib.Path]): List of image paths.
+        images (list[pathlib.Path]): List of image paths, one for each point.
+                                     Ignored if image_index is given.
         x (list[datetime]): _description_
         y (list[int]): _description_
         title (str, optional): _description_. Defaults to "".
+        image_index (images.ImageIndex, optional): If given, show the image
+                                                   taken nearest to each
+                                                   point instead. Defaults
+                                                   to None.
     """
-    ax_1.scatter(x, y, picker=True, **kwargs)
+    if image_index is None:
+        frames = np.arange(len(y))
+        show = _open_thumbnails(fig, images).get
+    else:
+        frames = image_index.match(x)
+        show = image_index.thumbnail
+
+    ax_1.scatter(_to_datetimes(x), y, picker=True, **kwargs)
     _set_info(ax_1, title, ylow=1000, yhigh=2500)
     _format_xaxis(ax_1)
-    fig.canvas.mpl_connect("pick_event", lambda event: _on_pick(event, ax_2, images, y))
+    fig.canvas.mpl_connect("pick_event", lambda event: _on_pick(event, ax_2, show, frames, y))
     ax_2.axis("off")
 
 
+def _open_thumbnails(fig: mpl.figure.Figure, file_paths: list[pathlib.Path]) -> images.ThumbnailCache:
+    """
+    Open a thumbnail cache of the images of a figure, which is closed with
+    the figure. Backends without a window never send a close event, so the
+    cache is also closed once the figure is garbage collected.
+
+    Args:
+        fig (mpl.figure.Figure): Figure the images are shown on.
+        file_paths (list[pathlib.Path]): Image paths.
+
+    Returns:
+        images.ThumbnailCache: The cache.
+    """
+    thumbnails = images.ThumbnailCache(file_paths)
+    fig.canvas.mpl_connect("close_event", lambda event: thumbnails.close())
+    weakref.finalize(fig, thumbnails.close)
+    return thumbnails
+
+
+def _to_datetimes(x):
+    """
+    Convert integer milliseconds, such as milliseconds since midnight, to
+    datetime64 values which matplotlib can plot. Any other x-values are
+    returned unchanged.
+
+    Args:
+        x: datetime objects or integer milliseconds.
+
+    Returns:
+        x-values which can be plotted on a time axis.
+    """
+    if isinstance(x, np.ndarray) and np.issubdtype(x.dtype, np.integer):
+        return x.astype("datetime64[ms]")
+    return x
+
+
 def _clean_null_values(x: list, y: list, null_value=-1) -> tuple[int]:
     """
     Return the data containing all points that are not null. Used to plot a
-    cleaner scatter graph.
+    cleaner scatter graph. Arrays are cleaned in one vectorized step and
+    returned as arrays.
 
     Args:
         x (list): datetime values on the x-axis.
@@ -132,12 +209,38 @@ def _clean_null_values(x: list, y: list, null_value=-1) -> tuple[int]:
     Returns:
         tuple[int]: x, y values to plot.
     """
+    if isinstance(y, np.ndarray):
+        valid = y != null_value
+        return np.asarray(x)[valid], y[valid]
     non_null_indices = [i for i in range(len(y)) if y[i] != null_value]
     x = [x[i] for i in non_null_indices]
     y = [y[i] for i in non_null_indices]
     return x, y
 
 
+def _min_max_indices(timestamps: np.ndarray, distances: np.ndarray, columns: int) -> np.ndarray:
+    """
+    Split the time axis into columns of equal width and find the nearest and
+    furthest point in each.
+
+    Args:
+        timestamps (np.ndarray): Milliseconds of each point.
+        distances (np.ndarray): Distance of each point.
+        columns (int): Number of columns.
+
+    Returns:
+        np.ndarray: Positions of the points to keep, in their original order.
+    """
+    start = timestamps.min()
+    span = int(timestamps.max() - start) + 1
+    column = (timestamps - start) * max(columns, 1) // span
+    order = np.lexsort((distances, column))
+    boundaries = np.flatnonzero(np.diff(column[order])) + 1
+    firsts = np.concatenate(([0], boundaries))
+    lasts = np.concatenate((boundaries - 1, [len(order) - 1]))
+    return np.unique(np.concatenate((order[firsts], order[lasts])))
+
+
 def _set_info(ax: mpl.axes.Axes, title: str, ylow=0, yhigh=5500, legend=None) -> None:
     """
     Set the information of a graph.
@@ -187,21 +290,24 @@ def _rotate_xticks(ax: mpl.axes.Axes) -> None:
     ax.tick_params(axis="x", labelrotation=45)
 
 
-def _on_pick(event, ax, images, distances):
+def _on_pick(event, ax, show, frames, distances):
     """
     Callback function for interactive plot.
 
     Args:
         event (_type_): _description_
         ax (_type_): _description_
-        images (_type_): _description_
+        show (Callable): Given the position of an image, returns its
+                         thumbnail.
+        frames (np.ndarray): Position of the image of each point, -1 if it
+                             has none.
         distances (_type_): _description_
     """
     ax.clear()
     ax.axis("off")
     i = event.ind[0]
-    img = np.asarray(Image.open(images[i]))
-    ax.imshow(img)
+    if frames[i] != -1:
+        ax.imshow(show(frames[i]))
     ax.text(
         0.5,
         0.5,